@@ -1,59 +1,164 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
 from app.core.config import Settings
 from app.core.dependencies import (
     get_agent,
     get_app_settings,
+    get_optional_history_builder,
+    get_optional_response_cache,
     get_optional_stocks_service,
     get_session_cache,
 )
-from app.schemas.chat import ChatMessage, ChatRequest, ChatResponse, HistoryResponse
+from app.core.errors import AppError
+from app.schemas.chat import (
+    ChatMessage,
+    ChatRequest,
+    ChatResponse,
+    HistoryResponse,
+    SessionStorageResponse,
+)
 from app.services.agent import ConversationAgent
+from app.services.history import HistoryBuilder
+from app.services.response_cache import ResponseCache
 from app.services.session_cache import SessionCache
+from app.services.stock_tools import tool_memo_scope
 from app.services.stocks_service import StocksService
-from app.services.stock_tools import build_stock_tools
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
-@router.post("", response_model=ChatResponse)
-def chat_endpoint(
+async def _prefetch_context(
     payload: ChatRequest,
-    agent: ConversationAgent = Depends(get_agent),
-    cache: SessionCache = Depends(get_session_cache),
-    settings: Settings = Depends(get_app_settings),
-    stocks: StocksService | None = Depends(get_optional_stocks_service),
-):
+    agent: ConversationAgent,
+    stocks: StocksService | None,
+    settings: Settings,
+) -> tuple[str, bool]:
+    """
+    Returns (context, use_tools). With `agent.prefetch_context` on, stock and
+    universe context is read from Mongo up front; when it covers the question
+    the turn runs without tools, saving the tool-call round trip.
+    """
+    if not settings.agent.prefetch_context or stocks is None:
+        return "", True
+    try:
+        prefetched = await asyncio.to_thread(
+            stocks.prefetch_context,
+            payload.message,
+            settings.eodhd.default_exchange,
+        )
+    except Exception:
+        logger.exception("Context prefetch failed; falling back to tools")
+        return "", True
+    skip_tools = prefetched.complete and settings.agent.prefetch_skip_tools
+    agent.record_prefetch(found=bool(prefetched.text.strip()), skipped_tools=skip_tools)
+    return prefetched.text.strip(), not skip_tools
+
+
+@dataclass(frozen=True)
+class _PreparedTurn:
+    stored: list[dict[str, Any]]  # session history as stored in Redis
+    history: list[dict[str, Any]]  # window sent to the LLM
+    context: str | None
+    use_tools: bool
+
+
+async def _prepare_turn(
+    payload: ChatRequest,
+    cache: SessionCache,
+    settings: Settings,
+    agent: ConversationAgent,
+    stocks: StocksService | None,
+    history_builder: HistoryBuilder | None,
+) -> _PreparedTurn:
     if not payload.session_id.strip():
         raise HTTPException(status_code=400, detail="session_id is required")
     if not payload.message.strip():
         raise HTTPException(status_code=400, detail="message cannot be empty")
 
     if payload.reset:
-        cache.reset(payload.session_id)
+        await cache.areset(payload.session_id)
+        stored: list[dict[str, Any]] = []
+    else:
+        stored = await cache.aget_history(payload.session_id)
 
-    history = cache.get_history(payload.session_id)
-    max_history = settings.agent.max_history
-    if len(history) > max_history:
-        history = history[-max_history:]
+    history = stored
+    if history_builder is not None:
+        history = (await history_builder.abuild(payload.session_id, history)).messages
+    else:
+        max_history = settings.agent.max_history
+        if len(history) > max_history:
+            history = history[-max_history:]
 
-    context_text = (payload.context or "").strip()
-    final_context = context_text if context_text else None
+    prefetched, use_tools = await _prefetch_context(payload, agent, stocks, settings)
+    parts = [part for part in ((payload.context or "").strip(), prefetched) if part]
+    final_context = "\n\n".join(parts) if parts else None
+    return _PreparedTurn(stored=stored, history=history, context=final_context, use_tools=use_tools)
 
-    tools = None
+
+async def _response_cache_key(
+    payload: ChatRequest,
+    history: list[dict[str, Any]],
+    context: str | None,
+    agent: ConversationAgent,
+    stocks: StocksService | None,
+    response_cache: ResponseCache | None,
+) -> str | None:
+    if response_cache is None:
+        return None
+    data_version = ""
     if stocks is not None:
-        tools = build_stock_tools(stocks, default_exchange=settings.eodhd.default_exchange)
+        try:
+            data_version = await asyncio.to_thread(stocks.data_version)
+        except Exception:
+            # Without the data version a hit could serve stale prices.
+            logger.warning("Could not read the prices data version; skipping response cache", exc_info=True)
+            return None
+    return response_cache.key(payload.message, history, context, agent.fingerprint, data_version)
 
-    reply = agent.generate(
-        user_message=payload.message,
-        history=history,
-        context=final_context,
-        tools=tools,
-    )
 
-    cache.append(payload.session_id, "user", payload.message)
-    cache.append(payload.session_id, "assistant", reply)
-    latest_history = cache.get_history(payload.session_id)
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("", response_model=ChatResponse)
+async def chat_endpoint(
+    payload: ChatRequest,
+    agent: ConversationAgent = Depends(get_agent),
+    cache: SessionCache = Depends(get_session_cache),
+    settings: Settings = Depends(get_app_settings),
+    stocks: StocksService | None = Depends(get_optional_stocks_service),
+    response_cache: ResponseCache | None = Depends(get_optional_response_cache),
+    history_builder: HistoryBuilder | None = Depends(get_optional_history_builder),
+):
+    turn = await _prepare_turn(payload, cache, settings, agent, stocks, history_builder)
+    cache_key = await _response_cache_key(payload, turn.history, turn.context, agent, stocks, response_cache)
+    reply = await response_cache.aget(cache_key) if response_cache and cache_key else None
+    cached = reply is not None
+    if reply is None:
+        with tool_memo_scope():
+            reply = await agent.agenerate(
+                user_message=payload.message,
+                history=turn.history,
+                context=turn.context,
+                use_tools=turn.use_tools,
+            )
+        if response_cache and cache_key:
+            await response_cache.aset(cache_key, reply)
+
+    latest_history = await cache.aappend_turn(
+        payload.session_id,
+        [("user", payload.message), ("assistant", reply)],
+        previous=turn.stored,
+    )
 
     history_items: list[ChatMessage] = []
     for item in latest_history:
@@ -68,21 +173,73 @@ def chat_endpoint(
         session_id=payload.session_id,
         reply=reply,
         history=history_items,
+        cached=cached,
+    )
+
+
+@router.post("/stream")
+async def chat_stream_endpoint(
+    payload: ChatRequest,
+    agent: ConversationAgent = Depends(get_agent),
+    cache: SessionCache = Depends(get_session_cache),
+    settings: Settings = Depends(get_app_settings),
+    stocks: StocksService | None = Depends(get_optional_stocks_service),
+    response_cache: ResponseCache | None = Depends(get_optional_response_cache),
+    history_builder: HistoryBuilder | None = Depends(get_optional_history_builder),
+):
+    turn = await _prepare_turn(payload, cache, settings, agent, stocks, history_builder)
+    cache_key = await _response_cache_key(payload, turn.history, turn.context, agent, stocks, response_cache)
+
+    async def events() -> AsyncIterator[str]:
+        reply = await response_cache.aget(cache_key) if response_cache and cache_key else None
+        cached = reply is not None
+        if cached:
+            yield _sse("token", {"text": reply})
+        else:
+            try:
+                with tool_memo_scope():
+                    async for item in agent.astream(
+                        user_message=payload.message,
+                        history=turn.history,
+                        context=turn.context,
+                        use_tools=turn.use_tools,
+                    ):
+                        if item["event"] == "final":
+                            reply = item["data"]["reply"]
+                            continue
+                        yield _sse(item["event"], item["data"])
+            except AppError as e:
+                yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+                return
+            if response_cache and cache_key:
+                await response_cache.aset(cache_key, reply or "")
+
+        await cache.aappend_turn(
+            payload.session_id,
+            [("user", payload.message), ("assistant", reply or "")],
+            previous=turn.stored,
+        )
+        yield _sse("done", {"session_id": payload.session_id, "reply": reply or "", "cached": cached})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @router.delete("/{session_id}", status_code=204)
-def reset_session(session_id: str, cache: SessionCache = Depends(get_session_cache)):
-    cache.reset(session_id)
+async def reset_session(session_id: str, cache: SessionCache = Depends(get_session_cache)):
+    await cache.areset(session_id)
 
 
 @router.get("/{session_id}", response_model=HistoryResponse)
-def get_session_history(
+async def get_session_history(
     session_id: str,
     cache: SessionCache = Depends(get_session_cache),
 ):
     history_items: list[ChatMessage] = []
-    for item in cache.get_history(session_id):
+    for item in await cache.aget_history(session_id):
         history_items.append(
             ChatMessage(
                 role=str(item.get("role") or "user"),
@@ -90,3 +247,12 @@ def get_session_history(
             )
         )
     return HistoryResponse(session_id=session_id, history=history_items)
+
+
+@router.get("/{session_id}/storage", response_model=SessionStorageResponse)
+async def get_session_storage(
+    session_id: str,
+    cache: SessionCache = Depends(get_session_cache),
+):
+    stats = await cache.astorage_stats(session_id)
+    return SessionStorageResponse(session_id=session_id, **stats)
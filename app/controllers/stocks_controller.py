@@ -1,78 +1,240 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any
 
-from app.core.dependencies import get_stocks_service
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.core.dependencies import get_job_manager, get_stocks_service
 from app.schemas.stocks import (
     BulkLastDayRequest,
+    BulkLastDayResponse,
+    ExchangeCoverageItem,
+    GapFillRequest,
+    GapRange,
+    GapReportResponse,
+    JobAccepted,
+    JobStatus,
     PriceDoc,
     PriceHistoryResponse,
+    SymbolCoverageItem,
+    SymbolSyncStatus,
     SyncTopRequest,
     SyncTopResponse,
     SyncSymbolsRequest,
     SyncSymbolsResponse,
     UniverseItem,
 )
-from app.services.stocks_service import StocksService
+from app.services.gaps import GapReport, GapScanner
+from app.services.jobs import JobHandle, JobManager
+from app.services.stocks_service import StocksService, SymbolSyncResult
 
 router = APIRouter(prefix="/stocks", tags=["stocks"])
 
 
-@router.post("/sync/top", response_model=SyncTopResponse)
+def _status_items(results: list[SymbolSyncResult]) -> list[SymbolSyncStatus]:
+    items: list[SymbolSyncStatus] = []
+    for r in results:
+        items.append(
+            SymbolSyncStatus(
+                symbol=r.symbol,
+                ok=r.ok,
+                rows=r.rows,
+                upserted_prices=r.upserted_prices,
+                inserted_prices=r.inserted_prices,
+                changed_prices=r.changed_prices,
+                unchanged_prices=r.unchanged_prices,
+                error=r.error,
+            )
+        )
+    return items
+
+
+@router.post("/sync/top", response_model=JobAccepted, status_code=202)
 def sync_top(
     payload: SyncTopRequest,
     svc: StocksService = Depends(get_stocks_service),
+    jobs: JobManager = Depends(get_job_manager),
 ):
-    res = svc.sync_top_eod(
-        exchange=payload.exchange,
-        limit=payload.limit,
-        min_market_cap=payload.min_market_cap,
-        from_date=payload.from_date,
-        to_date=payload.to_date,
-        period=payload.period,
-    )
-    return SyncTopResponse(
-        symbols=res.symbols,
-        upserted_prices=res.upserted_prices,
-        upserted_universe=res.upserted_universe,
-    )
+    def run(handle: JobHandle) -> dict[str, Any]:
+        res = svc.sync_top_eod(
+            exchange=payload.exchange,
+            limit=payload.limit,
+            min_market_cap=payload.min_market_cap,
+            from_date=payload.from_date,
+            to_date=payload.to_date,
+            period=payload.period,
+            incremental=payload.incremental,
+            on_result=handle.on_symbol,
+            on_total=handle.set_total,
+        )
+        return SyncTopResponse(
+            symbols=res.symbols,
+            upserted_prices=res.upserted_prices,
+            upserted_universe=res.upserted_universe,
+            inserted_prices=res.inserted_prices,
+            changed_prices=res.changed_prices,
+            unchanged_prices=res.unchanged_prices,
+            failed=[r.symbol for r in res.results if not r.ok],
+            results=_status_items(res.results),
+        ).model_dump()
+
+    job = jobs.submit("sync_top", run, params=payload.model_dump())
+    return JobAccepted(job_id=job.id, kind=job.kind, status=job.status)
 
 
-@router.post("/sync/bulk-last-day")
+@router.post("/sync/bulk-last-day", response_model=JobAccepted, status_code=202)
 def sync_bulk_last_day(
     payload: BulkLastDayRequest,
     svc: StocksService = Depends(get_stocks_service),
+    jobs: JobManager = Depends(get_job_manager),
 ):
     symbols = payload.symbols
     if symbols is None:
-        cur = (
-            svc.universe.find({}, projection={"_id": 0, "symbol": 1})
-            .sort([("market_capitalization", -1), ("MarketCapitalization", -1)])
-            .limit(int(payload.limit))
+        symbols = svc.top_universe_symbols(limit=payload.limit, exchange=payload.exchange_code)
+        if not symbols:
+            raise HTTPException(
+                status_code=409,
+                detail=f"no stored universe for {payload.exchange_code}; run /api/stocks/sync/top first",
+            )
+
+    def run(handle: JobHandle) -> dict[str, Any]:
+        res = svc.sync_bulk_last_day(
+            exchange_code=payload.exchange_code,
+            symbols=symbols,
+            on_chunk=handle.on_rows,
         )
-        symbols = []
-        for doc in cur:
-            sym = doc.get("symbol")
-            if sym:
-                symbols.append(sym)
-    upserted = svc.sync_bulk_last_day(
-        exchange_code=payload.exchange_code,
-        symbols=symbols,
-    )
-    return {"upserted": upserted}
+        return BulkLastDayResponse(
+            upserted=res.written,
+            inserted=res.inserted,
+            changed=res.changed,
+            unchanged=res.unchanged,
+        ).model_dump()
 
+    job = jobs.submit("sync_bulk_last_day", run, params=payload.model_dump())
+    return JobAccepted(job_id=job.id, kind=job.kind, status=job.status)
 
-@router.post("/sync/symbols", response_model=SyncSymbolsResponse)
+
+@router.post("/sync/symbols", response_model=JobAccepted, status_code=202)
 def sync_symbols(
     payload: SyncSymbolsRequest,
     svc: StocksService = Depends(get_stocks_service),
+    jobs: JobManager = Depends(get_job_manager),
+):
+    def run(handle: JobHandle) -> dict[str, Any]:
+        res = svc.sync_symbols(
+            symbols=payload.symbols,
+            default_exchange=payload.default_exchange,
+            from_date=payload.from_date,
+            to_date=payload.to_date,
+            period=payload.period,
+            incremental=payload.incremental,
+            on_result=handle.on_symbol,
+            on_total=handle.set_total,
+        )
+        return SyncSymbolsResponse(
+            symbols=res.symbols,
+            upserted_prices=res.upserted_prices,
+            inserted_prices=res.inserted_prices,
+            changed_prices=res.changed_prices,
+            unchanged_prices=res.unchanged_prices,
+            failed=[r.symbol for r in res.results if not r.ok],
+            results=_status_items(res.results),
+        ).model_dump()
+
+    job = jobs.submit("sync_symbols", run, params=payload.model_dump())
+    return JobAccepted(job_id=job.id, kind=job.kind, status=job.status)
+
+
+def _gap_report_response(report: GapReport) -> GapReportResponse:
+    return GapReportResponse(
+        from_date=report.from_date,
+        to_date=report.to_date,
+        requests=report.requests,
+        symbols=[
+            SymbolCoverageItem(
+                symbol=item.symbol,
+                exchange=item.exchange,
+                first_date=item.first_date,
+                last_date=item.last_date,
+                expected=item.expected,
+                present=item.present,
+                missing=item.missing,
+                coverage_pct=item.coverage_pct,
+                ranges=[GapRange(from_date=a, to_date=b) for a, b in item.ranges],
+            )
+            for item in report.symbols
+        ],
+        exchanges=[
+            ExchangeCoverageItem(
+                exchange=item.exchange,
+                symbols=item.symbols,
+                symbols_with_gaps=item.symbols_with_gaps,
+                expected=item.expected,
+                missing=item.missing,
+                coverage_pct=item.coverage_pct,
+            )
+            for item in report.exchanges
+        ],
+    )
+
+
+@router.get("/gaps", response_model=GapReportResponse)
+def scan_gaps(
+    symbols: list[str] | None = Query(default=None),
+    from_date: str | None = None,
+    to_date: str | None = None,
+    merge_within_days: int = Query(default=20, ge=0, le=260),
+    svc: StocksService = Depends(get_stocks_service),
+):
+    scanner = GapScanner(stocks=svc, merge_within_days=merge_within_days)
+    return _gap_report_response(scanner.scan(symbols=symbols, from_date=from_date, to_date=to_date))
+
+
+@router.post("/gaps/fill", response_model=JobAccepted, status_code=202)
+def fill_gaps(
+    payload: GapFillRequest,
+    svc: StocksService = Depends(get_stocks_service),
+    jobs: JobManager = Depends(get_job_manager),
 ):
-    res = svc.sync_symbols(
-        symbols=payload.symbols,
-        default_exchange=payload.default_exchange,
-        from_date=payload.from_date,
-        to_date=payload.to_date,
-        period=payload.period,
+    def run(handle: JobHandle) -> dict[str, Any]:
+        scanner = GapScanner(stocks=svc, merge_within_days=payload.merge_within_days)
+        report = scanner.scan(symbols=payload.symbols, from_date=payload.from_date, to_date=payload.to_date)
+        handle.set_total(report.requests)
+        scanner.fill(report, on_result=handle.on_symbol)
+        after = _gap_report_response(
+            scanner.scan(
+                symbols=[item.symbol for item in report.symbols],
+                from_date=report.from_date,
+                to_date=payload.to_date,
+            )
+        )
+        before = _gap_report_response(report)
+        return {
+            "requests": report.requests,
+            "before": [item.model_dump() for item in before.exchanges],
+            "after": [item.model_dump() for item in after.exchanges],
+            "still_missing": [item.symbol for item in after.symbols if item.missing][:100],
+        }
+
+    job = jobs.submit("fill_gaps", run, params=payload.model_dump())
+    return JobAccepted(job_id=job.id, kind=job.kind, status=job.status)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str, jobs: JobManager = Depends(get_job_manager)):
+    doc = jobs.get(job_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="job not found")
+    return JobStatus(
+        job_id=str(doc.get("_id")),
+        kind=str(doc.get("kind") or ""),
+        status=str(doc.get("status") or ""),
+        total=doc.get("total"),
+        done=int(doc.get("done") or 0),
+        failed=int(doc.get("failed") or 0),
+        rows_written=int(doc.get("rows_written") or 0),
+        elapsed_seconds=float(doc.get("elapsed_seconds") or 0.0),
+        errors=list(doc.get("errors") or []),
+        result=doc.get("result"),
     )
-    return SyncSymbolsResponse(symbols=res.symbols, upserted_prices=res.upserted_prices)
 
 
 @router.get("/universe/top", response_model=list[UniverseItem])
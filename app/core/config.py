@@ -1,13 +1,23 @@
 from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
 from app.core.utils import load_yaml
 
 
+class FakeLLMConfig(BaseModel):
+    latency_ms: float = Field(default=300.0, ge=0)
+    tokens_per_second: float = Field(default=50.0, ge=0)
+    reply_tokens: int = Field(default=60, ge=1)
+    tool_calls: bool = True
+
+
 class OpenAIConfig(BaseModel):
+    # "openai", or "fake" for the offline load-testing model (no API key needed).
+    provider: Literal["openai", "fake"] = "openai"
+    fake: FakeLLMConfig = Field(default_factory=FakeLLMConfig)
     model: str = "gpt-4.1"
     api_key: str | None = None
     api_key_env: str = "OPENAI_API_KEY"
@@ -18,11 +28,40 @@ class OpenAIConfig(BaseModel):
 class AgentConfig(BaseModel):
     system_prompt: str | None = None
     max_history: int = Field(default=16, ge=1)
+    # When set, history is windowed by tokens instead of max_history.
+    history_token_budget: int | None = Field(default=None, ge=64)
+    # Fold turns that fall out of the token window into a rolling summary.
+    history_summary: bool = True
+    # Build stock/universe context from Mongo before the LLM call.
+    prefetch_context: bool = False
+    # Skip tool calling when the prefetched context covers the question.
+    prefetch_skip_tools: bool = False
+    max_iterations: int = Field(default=3, ge=1)
+    # Deadline for each tool call; calls from one step run concurrently, so
+    # this bounds the whole step. 0 disables it.
+    tool_timeout_seconds: float = Field(default=15.0, ge=0)
+    # Cross-request memo of tool results (0 disables; repeats within one turn
+    # are always memoized).
+    tool_cache_ttl_seconds: float = Field(default=60.0, ge=0)
+    tool_cache_max_entries: int = Field(default=512, ge=1)
 
 
 class SessionCacheConfig(BaseModel):
     ttl_seconds: int = Field(default=7200, ge=60)
     max_messages: int = Field(default=20, ge=2)
+    # Per-process LRU of decoded histories (0 disables), kept coherent across
+    # workers through Redis pub/sub invalidation.
+    l1_max_sessions: int = Field(default=1000, ge=0)
+    l1_max_age_seconds: float = Field(default=30.0, gt=0)
+    # Stored message encoding; old JSON entries are always readable.
+    encoding: Literal["msgpack", "json"] = "msgpack"
+    compression: Literal["none", "zlib", "zstd"] = "zlib"
+    compress_min_bytes: int = Field(default=512, ge=0)
+
+
+class ResponseCacheConfig(BaseModel):
+    enabled: bool = False
+    ttl_seconds: int = Field(default=3600, ge=1)
 
 
 class RedisConfig(BaseModel):
@@ -30,6 +69,15 @@ class RedisConfig(BaseModel):
     url_env: str = "REDIS_URL"
     key_prefix: str = "conv-agent"
     verify_connection: bool = False
+    # Connections per client (sync and asyncio each), per node in cluster mode.
+    max_connections: int = Field(default=32, ge=1)
+    # Seconds to wait for a free pooled connection before failing.
+    pool_timeout: float = Field(default=5.0, gt=0)
+    socket_timeout: float | None = Field(default=5.0, gt=0)
+    socket_connect_timeout: float | None = Field(default=2.0, gt=0)
+    health_check_interval: int = Field(default=30, ge=0)
+    # Redis Cluster: session keys are hash-tagged so per-session data shares a slot.
+    cluster: bool = False
 
 
 class MongoConfig(BaseModel):
@@ -45,6 +93,39 @@ class EODHDConfig(BaseModel):
     base_url: str = "https://eodhd.com/api"
     default_exchange: str = "US"
     verify_connection: bool = False
+    pool_connections: int = Field(default=4, ge=1)
+    pool_maxsize: int = Field(default=16, ge=1)
+    pool_block: bool = False
+    connect_timeout: float = Field(default=5.0, gt=0)
+    read_timeout: float = Field(default=60.0, gt=0)
+    gzip: bool = True
+    rate_limit_per_minute: int = Field(default=1000, ge=0)
+    daily_limit: int | None = Field(default=100000, ge=1)
+    endpoint_costs: dict[str, int] = Field(default_factory=dict)
+    max_retries_on_429: int = Field(default=1, ge=0)
+
+
+class SyncConfig(BaseModel):
+    workers: int = Field(default=4, ge=1, le=64)
+    bulk_chunk_size: int = Field(default=1000, ge=1)
+    backfill_chunk_size: int = Field(default=100, ge=1)
+    backfill_workers: int = Field(default=2, ge=1, le=32)
+    max_concurrent_jobs: int = Field(default=2, ge=1, le=16)
+
+
+class SchedulerConfig(BaseModel):
+    enabled: bool = False
+    exchanges: list[str] = Field(default_factory=lambda: ["US"])
+    run_at: str = Field(default="19:30", pattern=r"^\d{1,2}:\d{2}$")
+    timezone: str = "America/New_York"
+    weekdays_only: bool = True
+    jitter_seconds: int = Field(default=300, ge=0)
+    lock_ttl_seconds: int = Field(default=6 * 3600, ge=60)
+    universe_limit: int | None = Field(default=20, ge=1)
+    # Top symbols per exchange whose context blocks are warmed into the tool
+    # memo after the refresh (0 disables), and how long warmed entries live.
+    warm_symbols: int = Field(default=20, ge=0)
+    warm_ttl_seconds: int = Field(default=24 * 3600, ge=60)
 
 
 class CORSConfig(BaseModel):
@@ -55,6 +136,11 @@ class CORSConfig(BaseModel):
     allow_headers: list[str] = Field(default_factory=lambda: ["*"])
 
 
+class MetricsConfig(BaseModel):
+    # Prometheus text exposition at GET /metrics, per worker process.
+    enabled: bool = True
+
+
 class AppConfig(BaseModel):
     name: str = "Conversation Agent"
 
@@ -64,10 +150,14 @@ class Settings(BaseModel):
     openai: OpenAIConfig = Field(default_factory=OpenAIConfig)
     agent: AgentConfig = Field(default_factory=AgentConfig)
     session_cache: SessionCacheConfig = Field(default_factory=SessionCacheConfig)
+    response_cache: ResponseCacheConfig = Field(default_factory=ResponseCacheConfig)
     redis: RedisConfig = Field(default_factory=RedisConfig)
     mongo: MongoConfig = Field(default_factory=MongoConfig)
     eodhd: EODHDConfig = Field(default_factory=EODHDConfig)
+    sync: SyncConfig = Field(default_factory=SyncConfig)
+    scheduler: SchedulerConfig = Field(default_factory=SchedulerConfig)
     cors: CORSConfig = Field(default_factory=CORSConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
 
 
 def _load_raw_config(path: str | Path) -> dict[str, Any]:
@@ -85,10 +175,14 @@ def build_settings(path: str | Path = "config.yaml") -> Settings:
         openai=OpenAIConfig(**(raw.get("openai") or {})),
         agent=AgentConfig(**(raw.get("agent") or {})),
         session_cache=SessionCacheConfig(**(raw.get("session_cache") or {})),
+        response_cache=ResponseCacheConfig(**(raw.get("response_cache") or {})),
         redis=RedisConfig(**(raw.get("redis") or {})),
         mongo=MongoConfig(**(raw.get("mongo") or {})),
         eodhd=EODHDConfig(**(raw.get("eodhd") or {})),
+        sync=SyncConfig(**(raw.get("sync") or {})),
+        scheduler=SchedulerConfig(**(raw.get("scheduler") or {})),
         cors=CORSConfig(**(raw.get("cors") or {})),
+        metrics=MetricsConfig(**(raw.get("metrics") or {})),
     )
 
 
@@ -4,6 +4,9 @@ from app.core.config import Settings, get_settings
 from app.core.mongo import MongoStore
 from app.services.agent import ConversationAgent
 from app.services.eodhd_client import EODHDClient
+from app.services.history import HistoryBuilder
+from app.services.jobs import JobManager
+from app.services.response_cache import ResponseCache
 from app.services.session_cache import SessionCache
 from app.services.stocks_service import StocksService
 
@@ -33,10 +36,25 @@ def get_stocks_service(request: Request) -> StocksService:
     return svc
 
 
+def get_job_manager(request: Request) -> JobManager:
+    jobs = getattr(request.app.state, "job_manager", None)
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="Stocks service is not configured.")
+    return jobs
+
+
 def get_optional_stocks_service(request: Request) -> StocksService | None:
     return getattr(request.app.state, "stocks_service", None)
 
 
+def get_optional_response_cache(request: Request) -> ResponseCache | None:
+    return getattr(request.app.state, "response_cache", None)
+
+
+def get_optional_history_builder(request: Request) -> HistoryBuilder | None:
+    return getattr(request.app.state, "history_builder", None)
+
+
 def get_agent(request: Request) -> ConversationAgent:
     return request.app.state.agent
 
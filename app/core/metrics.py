@@ -0,0 +1,195 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Latency buckets in seconds, wide enough for sub-millisecond Redis calls
+# and multi-second LLM turns.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, object]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (+Inf last), sum, count.
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            row[index] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, list(row)) for key, row in self._values.items())
+        lines: list[str] = []
+        bounds = [_number(b) for b in self.buckets] + ["+Inf"]
+        for key, row in values:
+            cumulative = 0
+            for bound, count in zip(bounds, row):
+                cumulative += count
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {row[-2]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# One registry per process; with several workers each one reports its own.
+REGISTRY = Registry()
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "conv_agent_http_request_duration_seconds",
+    "HTTP request latency until the response body is fully sent.",
+    ("method", "route", "status"),
+)
+EODHD_SECONDS = REGISTRY.histogram(
+    "conv_agent_eodhd_request_duration_seconds",
+    "EODHD request latency per endpoint, including parsing.",
+    ("endpoint",),
+)
+MONGO_SECONDS = REGISTRY.histogram(
+    "conv_agent_mongo_command_duration_seconds",
+    "MongoDB command latency as reported by the driver.",
+    ("collection", "command"),
+)
+REDIS_SECONDS = REGISTRY.histogram(
+    "conv_agent_redis_call_duration_seconds",
+    "Session cache Redis round-trip latency per operation.",
+    ("operation",),
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "conv_agent_llm_call_duration_seconds",
+    "Chat model call latency (one call per agent step).",
+    ("model",),
+)
+TOOL_SECONDS = REGISTRY.histogram(
+    "conv_agent_tool_call_duration_seconds",
+    "Agent tool call latency.",
+    ("tool",),
+)
+ERRORS = REGISTRY.counter(
+    "conv_agent_errors_total",
+    "Failed calls per stage and error type.",
+    ("stage", "error"),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "conv_agent_cache_requests_total",
+    "Cache lookups per cache and result.",
+    ("cache", "result"),
+)
+BYTES = REGISTRY.counter(
+    "conv_agent_transferred_bytes_total",
+    "Payload bytes per stage and direction.",
+    ("stage", "direction"),
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, stage: str, **labels: object) -> Iterator[None]:
+    """Observe the block's latency in `histogram` and count it in ERRORS if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
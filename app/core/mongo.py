@@ -1,12 +1,49 @@
 import os
+import threading
 from dataclasses import dataclass
+from typing import Any
 
-from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, monitoring
 from pymongo.database import Database
 
+from app.core import metrics
 from app.core.config import MongoConfig
 
 
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Per-collection, per-command latency from the driver's command monitoring,
+    so cursor batches (getMore) are timed as well as the initial query.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._collections: dict[tuple[Any, int], str] = {}
+
+    def _collection(self, event: Any) -> str:
+        with self._lock:
+            return self._collections.pop((event.connection_id, event.request_id), "-")
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        command = event.command
+        target = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else "-"
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        metrics.MONGO_SECONDS.observe(
+            event.duration_micros / 1e6, collection=self._collection(event), command=event.command_name
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        metrics.MONGO_SECONDS.observe(
+            event.duration_micros / 1e6, collection=self._collection(event), command=event.command_name
+        )
+        failure = event.failure if isinstance(event.failure, dict) else {}
+        error = failure.get("codeName") or failure.get("errtype") or "CommandFailed"
+        metrics.ERRORS.inc(stage="mongo", error=str(error))
+
+
 @dataclass(frozen=True)
 class MongoStore:
     client: MongoClient
@@ -15,7 +52,7 @@ class MongoStore:
     @classmethod
     def from_config(cls, cfg: MongoConfig) -> "MongoStore":
         uri = os.getenv(cfg.uri_env) or cfg.uri
-        client = MongoClient(uri)
+        client = MongoClient(uri, event_listeners=[CommandMetrics()])
         db = client[cfg.database]
         store = cls(client=client, db=db)
         store._ensure_indexes()
@@ -34,3 +71,9 @@ class MongoStore:
         news.create_index([("symbol", ASCENDING), ("date", DESCENDING)])
         news.create_index([("symbol", ASCENDING), ("url", ASCENDING)], unique=True, sparse=True)
         news.create_index("fetched_at", expireAfterSeconds=60 * 60 * 24 * 30)
+
+        chunks = self.db["backfill_chunks"]
+        chunks.create_index([("job_id", ASCENDING), ("chunk", ASCENDING)], unique=True)
+
+        jobs = self.db["sync_jobs"]
+        jobs.create_index("created_at", expireAfterSeconds=60 * 60 * 24 * 7)
@@ -0,0 +1,51 @@
+from typing import TYPE_CHECKING, Any
+
+from app.core.config import RedisConfig
+
+if TYPE_CHECKING:
+    from redis import Redis
+    from redis.asyncio import Redis as AsyncRedis
+
+
+def _connection_kwargs(cfg: RedisConfig) -> dict[str, Any]:
+    return {
+        "socket_timeout": cfg.socket_timeout,
+        "socket_connect_timeout": cfg.socket_connect_timeout,
+        "health_check_interval": cfg.health_check_interval,
+    }
+
+
+def build_redis_clients(url: str, cfg: RedisConfig) -> tuple["Redis", "AsyncRedis"]:
+    """
+    Sync + asyncio clients for `url` with the pool limits from `cfg`.
+
+    Standalone mode uses BlockingConnectionPool, so a worker never opens more
+    than `max_connections` per client; callers wait up to `pool_timeout` for
+    a free connection instead of opening another one. Cluster mode caps
+    connections per node.
+    """
+    import redis  # local import so py_compile works without the dependency installed
+    import redis.asyncio
+
+    kwargs = _connection_kwargs(cfg)
+    if cfg.cluster:
+        from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+        from redis.cluster import RedisCluster
+
+        sync_client = RedisCluster.from_url(url, max_connections=cfg.max_connections, **kwargs)
+        async_client = AsyncRedisCluster.from_url(url, max_connections=cfg.max_connections, **kwargs)
+        return sync_client, async_client  # type: ignore[return-value]
+
+    sync_pool = redis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=cfg.max_connections,
+        timeout=cfg.pool_timeout,
+        **kwargs,
+    )
+    async_pool = redis.asyncio.BlockingConnectionPool.from_url(
+        url,
+        max_connections=cfg.max_connections,
+        timeout=cfg.pool_timeout,
+        **kwargs,
+    )
+    return redis.Redis(connection_pool=sync_pool), redis.asyncio.Redis(connection_pool=async_pool)
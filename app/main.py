@@ -1,27 +1,77 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
+from functools import partial
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.controllers.chat_controller import router as chat_router
 from app.controllers.stocks_controller import router as stocks_router
+from app.core import metrics
 from app.core.app_logging import setup_logging
 from app.core.error_handlers import app_error_handler, unhandled_error_handler
 from app.core.errors import AppError
 from app.core.mongo import MongoStore
 from app.core.config import Settings, get_settings
+from app.middleware.metrics import MetricsMiddleware
 from app.middleware.process_time import ProcessTimeMiddleware
 from app.middleware.request_id import RequestIDMiddleware
 from app.services.agent import ConversationAgent
+from app.services.codec import MessageCodec
 from app.services.eodhd_client import EODHDClient
+from app.services.history import HistoryBuilder
+from app.services.jobs import JobManager
+from app.services.response_cache import ResponseCache
+from app.services.scheduler import DailyRefreshScheduler
 from app.services.session_cache import SessionCache
+from app.services.stock_tools import ToolMemo, build_stock_tools
 from app.services.stocks_service import StocksService
+from app.services.tokens import count_tokens, load_encoder
+
+
+def _build_tools(app: FastAPI, settings: Settings):
+    stocks = app.state.stocks_service
+    if stocks is None:
+        app.state.tool_memo = None
+        return None
+    app.state.tool_memo = ToolMemo(
+        ttl_seconds=settings.agent.tool_cache_ttl_seconds,
+        max_entries=settings.agent.tool_cache_max_entries,
+    )
+    return build_stock_tools(
+        stocks,
+        default_exchange=settings.eodhd.default_exchange,
+        timeout_seconds=settings.agent.tool_timeout_seconds,
+        memo=app.state.tool_memo,
+    )
 
 
 def create_app(settings: Settings | None = None) -> FastAPI:
     settings = settings or get_settings()
     setup_logging()
-    app = FastAPI(title=settings.app.name)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.session_cache.start_listener()
+        await asyncio.to_thread(load_encoder, settings.openai.model)
+        if app.state.job_manager is not None:
+            await asyncio.to_thread(app.state.job_manager.recover_interrupted)
+        scheduler = getattr(app.state, "scheduler", None)
+        if scheduler is not None:
+            scheduler.start()
+        try:
+            yield
+        finally:
+            if scheduler is not None:
+                scheduler.stop()
+            if app.state.job_manager is not None:
+                app.state.job_manager.shutdown()
+            if app.state.eodhd_client is not None:
+                app.state.eodhd_client.close()
+            await app.state.session_cache.aclose()
+
+    app = FastAPI(title=settings.app.name, lifespan=lifespan)
 
     if settings.cors.enabled:
         app.add_middleware(
@@ -33,6 +83,8 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         )
     app.add_middleware(RequestIDMiddleware)
     app.add_middleware(ProcessTimeMiddleware)
+    if settings.metrics.enabled:
+        app.add_middleware(MetricsMiddleware)
     app.add_exception_handler(AppError, app_error_handler)
     app.add_exception_handler(Exception, unhandled_error_handler)
 
@@ -40,11 +92,29 @@ def create_app(settings: Settings | None = None) -> FastAPI:
     app.state.session_cache = SessionCache(
         redis_url=os.getenv(settings.redis.url_env) or settings.redis.url,
         key_prefix=settings.redis.key_prefix,
+        redis_cfg=settings.redis,
         ttl_seconds=settings.session_cache.ttl_seconds,
         max_messages=settings.session_cache.max_messages,
+        token_counter=partial(count_tokens, model=settings.openai.model),
+        l1_max_sessions=settings.session_cache.l1_max_sessions,
+        l1_max_age_seconds=settings.session_cache.l1_max_age_seconds,
+        codec=MessageCodec(
+            serializer=settings.session_cache.encoding,
+            compression=settings.session_cache.compression,
+            compress_min_bytes=settings.session_cache.compress_min_bytes,
+        ),
     )
     if settings.redis.verify_connection:
         app.state.session_cache.ping()
+    app.state.response_cache = (
+        ResponseCache(
+            aredis=app.state.session_cache.aredis,
+            key_prefix=settings.redis.key_prefix,
+            ttl_seconds=settings.response_cache.ttl_seconds,
+        )
+        if settings.response_cache.enabled
+        else None
+    )
 
     try:
         app.state.mongo_store = MongoStore.from_config(settings.mongo)
@@ -55,22 +125,87 @@ def create_app(settings: Settings | None = None) -> FastAPI:
 
     eodhd_token = (os.getenv(settings.eodhd.api_token_env) or settings.eodhd.api_token or "").strip()
     app.state.eodhd_client = (
-        EODHDClient(api_token=eodhd_token, base_url=settings.eodhd.base_url) if eodhd_token else None
+        EODHDClient.from_config(settings.eodhd, api_token=eodhd_token) if eodhd_token else None
     )
     app.state.stocks_service = (
-        StocksService(mongo=app.state.mongo_store, eodhd=app.state.eodhd_client)
+        StocksService(
+            mongo=app.state.mongo_store,
+            eodhd=app.state.eodhd_client,
+            sync_workers=settings.sync.workers,
+            bulk_chunk_size=settings.sync.bulk_chunk_size,
+        )
         if app.state.eodhd_client is not None and app.state.mongo_store is not None
         else None
     )
+    app.state.job_manager = (
+        JobManager(
+            collection=app.state.mongo_store.db["sync_jobs"],
+            max_concurrent=settings.sync.max_concurrent_jobs,
+        )
+        if app.state.stocks_service is not None
+        else None
+    )
     app.state.agent = ConversationAgent(
         openai_cfg=settings.openai,
         agent_cfg=settings.agent,
+        tools=_build_tools(app, settings),
+    )
+    app.state.scheduler = (
+        DailyRefreshScheduler(
+            cfg=settings.scheduler,
+            stocks=app.state.stocks_service,
+            redis=app.state.session_cache.redis,
+            key_prefix=settings.redis.key_prefix,
+            memo=app.state.tool_memo,
+        )
+        if settings.scheduler.enabled and app.state.stocks_service is not None
+        else None
+    )
+    app.state.history_builder = (
+        HistoryBuilder(
+            cache=app.state.session_cache,
+            agent=app.state.agent,
+            token_budget=settings.agent.history_token_budget,
+            summarize=settings.agent.history_summary,
+        )
+        if settings.agent.history_token_budget
+        else None
     )
 
     @app.get("/health", tags=["health"])
     def healthcheck():
         return {"status": "ok"}
 
+    @app.post("/reload", tags=["health"])
+    def reload_agent():
+        # Re-read config.yaml and rebuild the LLM client, tools and executor.
+        get_settings.cache_clear()
+        fresh = get_settings()
+        app.state.settings = fresh
+        app.state.agent.reload(
+            openai_cfg=fresh.openai,
+            agent_cfg=fresh.agent,
+            tools=_build_tools(app, fresh),
+        )
+        return {"status": "reloaded", "agent": app.state.agent.stats()}
+
+    @app.get("/stats", tags=["health"])
+    def stats():
+        out: dict = {"agent": app.state.agent.stats(), "session_cache": app.state.session_cache.stats()}
+        if app.state.eodhd_client is not None:
+            out["eodhd"] = app.state.eodhd_client.stats()
+        if app.state.response_cache is not None:
+            out["response_cache"] = app.state.response_cache.stats()
+        if app.state.tool_memo is not None:
+            out["tool_memo"] = app.state.tool_memo.stats()
+        return out
+
+    if settings.metrics.enabled:
+
+        @app.get("/metrics", tags=["health"], include_in_schema=False)
+        def metrics_endpoint():
+            return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
     app.include_router(chat_router, prefix="/api")
     app.include_router(stocks_router, prefix="/api")
     return app
@@ -1,18 +1,26 @@
 import time
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-from starlette.types import ASGIApp
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
-class ProcessTimeMiddleware(BaseHTTPMiddleware):
+class ProcessTimeMiddleware:
+    """Adds the seconds until the response headers were sent (plain ASGI)."""
+
     def __init__(self, app: ASGIApp, header_name: str = "X-Process-Time"):
-        super().__init__(app)
+        self.app = app
         self.header_name = header_name
 
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         start = time.perf_counter()
-        response: Response = await call_next(request)
-        response.headers[self.header_name] = f"{time.perf_counter() - start:.6f}"
-        return response
+
+        async def send_with_time(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[self.header_name] = f"{time.perf_counter() - start:.6f}"
+            await send(message)
+
+        await self.app(scope, receive, send_with_time)
@@ -1,24 +1,35 @@
 import uuid
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-from starlette.types import ASGIApp
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core.app_logging import reset_request_id, set_request_id
 
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
+class RequestIDMiddleware:
+    """
+    Plain ASGI middleware: the request id is set for the whole request,
+    including a streamed body, and echoed on the response headers.
+    """
+
     def __init__(self, app: ASGIApp, header_name: str = "X-Request-ID"):
-        super().__init__(app)
+        self.app = app
         self.header_name = header_name
 
-    async def dispatch(self, request: Request, call_next):
-        request_id = request.headers.get(self.header_name) or str(uuid.uuid4())
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(self.header_name) or str(uuid.uuid4())
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[self.header_name] = request_id
+            await send(message)
+
         token = set_request_id(request_id)
         try:
-            response: Response = await call_next(request)
+            await self.app(scope, receive, send_with_id)
         finally:
             reset_request_id(token)
-        response.headers[self.header_name] = request_id
-        return response
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -21,8 +21,22 @@ class ChatResponse(BaseModel):
     session_id: str
     reply: str
     history: List[ChatMessage]
+    cached: bool = Field(default=False, description="True when the reply came from the response cache.")
 
 
 class HistoryResponse(BaseModel):
     session_id: str
     history: List[ChatMessage]
+
+
+class SessionStorageResponse(BaseModel):
+    session_id: str
+    messages: int
+    stored_bytes: int = Field(..., description="Bytes of the stored (encoded) message entries.")
+    legacy_json_bytes: int = Field(..., description="Bytes the same messages take as plain JSON.")
+    saved_bytes: int
+    saved_pct: float
+    redis_memory_bytes: Optional[int] = Field(
+        default=None, description="MEMORY USAGE of the session key, when the server supports it."
+    )
+    formats: Dict[str, int] = Field(default_factory=dict, description="Entry count per encoding.")
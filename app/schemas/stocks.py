@@ -12,12 +12,32 @@ class SyncTopRequest(BaseModel):
     from_date: Optional[str] = Field(default=None, description="YYYY-MM-DD")
     to_date: Optional[str] = Field(default=None, description="YYYY-MM-DD")
     period: str = Field(default="d", description="d (daily), w (weekly), m (monthly)")
+    incremental: bool = Field(
+        default=False,
+        description="When from_date is null, fetch only bars after each symbol's latest stored date.",
+    )
+
+
+class SymbolSyncStatus(BaseModel):
+    symbol: str
+    ok: bool
+    rows: int = 0
+    upserted_prices: int = 0
+    inserted_prices: int = 0
+    changed_prices: int = 0
+    unchanged_prices: int = 0
+    error: Optional[str] = None
 
 
 class SyncTopResponse(BaseModel):
     symbols: List[str]
     upserted_prices: int
     upserted_universe: int
+    inserted_prices: int = 0
+    changed_prices: int = 0
+    unchanged_prices: int = 0
+    failed: List[str] = Field(default_factory=list)
+    results: List[SymbolSyncStatus] = Field(default_factory=list)
 
 
 class SyncSymbolsRequest(BaseModel):
@@ -26,11 +46,20 @@ class SyncSymbolsRequest(BaseModel):
     from_date: Optional[str] = Field(default=None, description="YYYY-MM-DD")
     to_date: Optional[str] = Field(default=None, description="YYYY-MM-DD")
     period: str = Field(default="d", description="d (daily), w (weekly), m (monthly)")
+    incremental: bool = Field(
+        default=False,
+        description="When from_date is null, fetch only bars after each symbol's latest stored date.",
+    )
 
 
 class SyncSymbolsResponse(BaseModel):
     symbols: List[str]
     upserted_prices: int
+    inserted_prices: int = 0
+    changed_prices: int = 0
+    unchanged_prices: int = 0
+    failed: List[str] = Field(default_factory=list)
+    results: List[SymbolSyncStatus] = Field(default_factory=list)
 
 
 class BulkLastDayRequest(BaseModel):
@@ -46,6 +75,80 @@ class BulkLastDayRequest(BaseModel):
     )
 
 
+class BulkLastDayResponse(BaseModel):
+    upserted: int
+    inserted: int = 0
+    changed: int = 0
+    unchanged: int = 0
+
+
+class JobAccepted(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str = Field(..., description="queued, running, done, failed or interrupted")
+    total: Optional[int] = Field(default=None, description="Symbols (or rows) to process, when known.")
+    done: int = 0
+    failed: int = 0
+    rows_written: int = 0
+    elapsed_seconds: float = 0.0
+    errors: List[str] = Field(default_factory=list)
+    result: Optional[Dict[str, Any]] = None
+
+
+class GapRange(BaseModel):
+    from_date: str
+    to_date: str
+
+
+class SymbolCoverageItem(BaseModel):
+    symbol: str
+    exchange: str
+    first_date: Optional[str] = None
+    last_date: Optional[str] = None
+    expected: int
+    present: int
+    missing: int
+    coverage_pct: float
+    ranges: List[GapRange] = Field(default_factory=list)
+
+
+class ExchangeCoverageItem(BaseModel):
+    exchange: str
+    symbols: int
+    symbols_with_gaps: int
+    expected: int
+    missing: int
+    coverage_pct: float
+
+
+class GapReportResponse(BaseModel):
+    from_date: str
+    to_date: str
+    requests: int = Field(..., description="EODHD eod calls needed to fill every gap.")
+    symbols: List[SymbolCoverageItem]
+    exchanges: List[ExchangeCoverageItem]
+
+
+class GapFillRequest(BaseModel):
+    symbols: Optional[List[str]] = Field(
+        default=None, description="Symbols to scan; null scans every stored symbol."
+    )
+    from_date: Optional[str] = Field(default=None, description="YYYY-MM-DD (default: 1 year back)")
+    to_date: Optional[str] = Field(default=None, description="YYYY-MM-DD (default: last trading day)")
+    merge_within_days: int = Field(
+        default=20,
+        ge=0,
+        le=260,
+        description="Gaps this many trading days apart or closer share one eod request.",
+    )
+
+
 class UniverseItem(BaseModel):
     symbol: str
     exchange: Optional[str] = None
@@ -1,49 +1,248 @@
+import hashlib
 import logging
 import os
-from typing import Iterable, Optional
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterable, Optional
+from uuid import UUID
 
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.tools import BaseTool
 from langchain_openai import ChatOpenAI
 
-from prompts import SYSTEM_AGENT
+from prompts import SYSTEM_AGENT, SYSTEM_SUMMARY
+from app.core import metrics
 from app.core.config import AgentConfig, OpenAIConfig
 from app.core.errors import UpstreamError
 from app.core.utils import normalize_text
+from app.services.fake_llm import FakeChatModel
 
 logger = logging.getLogger(__name__)
 
 
+class _CallMetrics(BaseCallbackHandler):
+    """Times the chat model and tool calls of every run into the metrics registry."""
+
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._lock = threading.Lock()
+        self._started: dict[UUID, tuple[metrics.Histogram, dict[str, str], float]] = {}
+
+    def _start(self, run_id: UUID, histogram: metrics.Histogram, labels: dict[str, str]) -> None:
+        with self._lock:
+            self._started[run_id] = (histogram, labels, time.perf_counter())
+
+    def _finish(self, run_id: UUID, error: BaseException | None = None, stage: str = "") -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        histogram, labels, at = started
+        histogram.observe(time.perf_counter() - at, **labels)
+        if error is not None:
+            metrics.ERRORS.inc(stage=stage, error=type(error).__name__)
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, metrics.LLM_SECONDS, {"model": self.model})
+
+    def on_llm_start(self, serialized: Any, prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, metrics.LLM_SECONDS, {"model": self.model})
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error, "llm")
+
+    def on_tool_start(self, serialized: Any, input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "unknown"
+        self._start(run_id, metrics.TOOL_SECONDS, {"tool": str(name)})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error, "tool")
+
+
+@dataclass(frozen=True)
+class _AgentRuntime:
+    llm: BaseChatModel
+    prompt: ChatPromptTemplate
+    chain: Any
+    tools: tuple[BaseTool, ...]
+    executor: AgentExecutor | None
+    max_iterations: int
+    fingerprint: str
+    build_ms: float
+    call_metrics: _CallMetrics
+
+
 class ConversationAgent:
     """
     LangChain-based chat agent with optional OpenAI tool calling.
+
+    The LLM client, prompt, tool schemas and AgentExecutor are built once and
+    reused by every request; `reload()` swaps in a freshly built runtime.
     """
 
-    def __init__(self, openai_cfg: OpenAIConfig, agent_cfg: AgentConfig):
+    def __init__(
+        self,
+        openai_cfg: OpenAIConfig,
+        agent_cfg: AgentConfig,
+        tools: Optional[list[BaseTool]] = None,
+    ):
+        self._lock = threading.Lock()
+        self._builds = 0
+        self._prefetch = {"turns": 0, "context_hits": 0, "tool_calls_skipped": 0}
+        self._runtime = self._build_runtime(openai_cfg, agent_cfg, tools)
+
+    def _build_runtime(
+        self,
+        openai_cfg: OpenAIConfig,
+        agent_cfg: AgentConfig,
+        tools: Optional[list[BaseTool]],
+    ) -> _AgentRuntime:
+        started = time.perf_counter()
+        llm = self._build_llm(openai_cfg)
+        system_prompt = (agent_cfg.system_prompt or SYSTEM_AGENT).strip()
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", system_prompt),
+                MessagesPlaceholder("chat_history"),
+                ("system", "Context (optional):\n{context}"),
+                ("human", "{input}"),
+                MessagesPlaceholder("agent_scratchpad"),
+            ]
+        )
+        tool_list = tuple(tools or ())
+        max_iterations = int(agent_cfg.max_iterations)
+        executor = self._build_executor(llm, prompt, tool_list, max_iterations) if tool_list else None
+        # Identifies everything besides the inputs that shapes a reply.
+        fingerprint = hashlib.blake2b(
+            "|".join(
+                [
+                    openai_cfg.provider,
+                    openai_cfg.model,
+                    repr(openai_cfg.temperature),
+                    repr(openai_cfg.top_p),
+                    system_prompt,
+                    str(max_iterations),
+                    *sorted(tool.name for tool in tool_list),
+                ]
+            ).encode("utf-8"),
+            digest_size=8,
+        ).hexdigest()
+        build_ms = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            self._builds += 1
+        logger.info("Agent runtime built in %.1f ms (%d tools)", build_ms, len(tool_list))
+        return _AgentRuntime(
+            llm=llm,
+            prompt=prompt,
+            chain=prompt | llm,
+            tools=tool_list,
+            executor=executor,
+            max_iterations=max_iterations,
+            fingerprint=fingerprint,
+            build_ms=build_ms,
+            call_metrics=_CallMetrics("fake" if openai_cfg.provider == "fake" else openai_cfg.model),
+        )
+
+    def _build_llm(self, openai_cfg: OpenAIConfig) -> BaseChatModel:
+        if openai_cfg.provider == "fake":
+            logger.warning("Using the fake chat model; replies are synthetic")
+            return FakeChatModel(
+                latency_ms=openai_cfg.fake.latency_ms,
+                tokens_per_second=openai_cfg.fake.tokens_per_second,
+                reply_tokens=openai_cfg.fake.reply_tokens,
+                tool_calls=openai_cfg.fake.tool_calls,
+            )
         key = (openai_cfg.api_key or "").strip() or os.getenv(openai_cfg.api_key_env)
         if not key:
             raise RuntimeError(
                 f"Missing OpenAI API key. Set it in config.yaml or env var {openai_cfg.api_key_env}."
             )
         os.environ[openai_cfg.api_key_env] = key
-        self.llm = ChatOpenAI(
+        return ChatOpenAI(
             model=openai_cfg.model,
             temperature=openai_cfg.temperature,
             top_p=openai_cfg.top_p,
         )
-        self.system_prompt = (agent_cfg.system_prompt or SYSTEM_AGENT).strip()
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", self.system_prompt),
-                MessagesPlaceholder("chat_history"),
-                ("system", "Context (optional):\n{context}"),
-                ("human", "{input}"),
-                MessagesPlaceholder("agent_scratchpad"),
-            ]
+
+    def _build_executor(
+        self,
+        llm: BaseChatModel,
+        prompt: ChatPromptTemplate,
+        tools: tuple[BaseTool, ...],
+        max_iterations: int,
+    ) -> AgentExecutor:
+        # On the async path AgentExecutor gathers all tool calls of one step,
+        # so a step costs as much as its slowest tool, not the sum.
+        agent = create_openai_tools_agent(llm, list(tools), prompt)
+        return AgentExecutor(
+            agent=agent,
+            tools=list(tools),
+            verbose=False,
+            max_iterations=max_iterations,
         )
 
+    def reload(
+        self,
+        openai_cfg: OpenAIConfig,
+        agent_cfg: AgentConfig,
+        tools: Optional[list[BaseTool]] = None,
+    ) -> None:
+        # Build first, then swap the reference: in-flight requests keep the
+        # runtime they started with.
+        runtime = self._build_runtime(openai_cfg, agent_cfg, tools)
+        self._runtime = runtime
+
+    @property
+    def llm(self) -> BaseChatModel:
+        return self._runtime.llm
+
+    @property
+    def prompt(self) -> ChatPromptTemplate:
+        return self._runtime.prompt
+
+    @property
+    def tools(self) -> list[BaseTool]:
+        return list(self._runtime.tools)
+
+    @property
+    def fingerprint(self) -> str:
+        return self._runtime.fingerprint
+
+    def record_prefetch(self, found: bool, skipped_tools: bool) -> None:
+        with self._lock:
+            self._prefetch["turns"] += 1
+            self._prefetch["context_hits"] += int(found)
+            self._prefetch["tool_calls_skipped"] += int(skipped_tools)
+
+    def stats(self) -> dict[str, Any]:
+        runtime = self._runtime
+        with self._lock:
+            builds = self._builds
+            prefetch = dict(self._prefetch)
+        turns = prefetch["turns"]
+        prefetch["skip_ratio"] = round(prefetch["tool_calls_skipped"] / turns, 4) if turns else 0.0
+        return {
+            "builds": builds,
+            "tools": len(runtime.tools),
+            "max_iterations": runtime.max_iterations,
+            # Cost of rebuilding tools + executor; previously paid per request.
+            "runtime_build_ms": round(runtime.build_ms, 3),
+            "prefetch": prefetch,
+        }
+
     def _convert_history(self, history: Optional[Iterable[dict]]) -> list[BaseMessage]:
         messages: list[BaseMessage] = []
         for item in history or []:
@@ -59,51 +258,143 @@ class ConversationAgent:
                 messages.append(HumanMessage(content=content))
         return messages
 
+    def _select_runnable(
+        self,
+        tools: Optional[list[BaseTool]],
+        use_tools: bool,
+    ) -> tuple[Any, bool]:
+        runtime = self._runtime
+        executor = runtime.executor if use_tools else None
+        if use_tools and tools and tuple(tools) != runtime.tools:
+            # Ad-hoc tool set: build a one-off executor (the slow path).
+            executor = self._build_executor(runtime.llm, runtime.prompt, tuple(tools), runtime.max_iterations)
+        if executor is not None:
+            return executor, True
+        return runtime.chain, False
+
+    def _run_config(self) -> dict[str, Any]:
+        return {"callbacks": [self._runtime.call_metrics]}
+
+    def _inputs(
+        self,
+        user_message: str,
+        history: Optional[Iterable[dict]],
+        context: str | None,
+        with_scratchpad: bool,
+    ) -> dict[str, Any]:
+        inputs: dict[str, Any] = {
+            "input": user_message,
+            "context": (context or "").strip(),
+            "chat_history": self._convert_history(history),
+        }
+        if with_scratchpad:
+            inputs["agent_scratchpad"] = []
+        return inputs
+
+    def _output_text(self, result: Any, is_executor: bool) -> str:
+        value = result.get("output") if is_executor else getattr(result, "content", "")
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            return value
+        return str(value)
+
     def generate(
         self,
         user_message: str,
         history: Optional[Iterable[dict]] = None,
         context: str | None = None,
         tools: Optional[list[BaseTool]] = None,
+        use_tools: bool = True,
     ) -> str:
-        def to_text(value: object) -> str:
-            if value is None:
-                return ""
-            if isinstance(value, str):
-                return value
-            return str(value)
-
-        history_messages = self._convert_history(history)
-        context_text = (context or "").strip()
+        runnable, is_executor = self._select_runnable(tools, use_tools)
+        inputs = self._inputs(user_message, history, context, with_scratchpad=not is_executor)
         try:
-            if tools:
-                agent = create_openai_tools_agent(self.llm, tools, self.prompt)
-                executor = AgentExecutor(
-                    agent=agent,
-                    tools=tools,
-                    verbose=False,
-                    max_iterations=3,
-                )
-                result = executor.invoke(
-                    {
-                        "input": user_message,
-                        "context": context_text,
-                        "chat_history": history_messages,
-                    }
-                )
-                text = to_text(result.get("output"))
-            else:
-                chain = self.prompt | self.llm
-                result = chain.invoke(
-                    {
-                        "input": user_message,
-                        "context": context_text,
-                        "chat_history": history_messages,
-                        "agent_scratchpad": [],
-                    }
-                )
-                text = to_text(getattr(result, "content", ""))
+            result = runnable.invoke(inputs, config=self._run_config())
         except Exception:
             logger.exception("LLM request failed")
             raise UpstreamError("Upstream LLM provider error")
-        return normalize_text(text)
+        return normalize_text(self._output_text(result, is_executor))
+
+    async def agenerate(
+        self,
+        user_message: str,
+        history: Optional[Iterable[dict]] = None,
+        context: str | None = None,
+        tools: Optional[list[BaseTool]] = None,
+        use_tools: bool = True,
+    ) -> str:
+        # Same as generate(), but awaits the LLM and tools on the event loop
+        # instead of holding a worker thread for the whole turn.
+        runnable, is_executor = self._select_runnable(tools, use_tools)
+        inputs = self._inputs(user_message, history, context, with_scratchpad=not is_executor)
+        try:
+            result = await runnable.ainvoke(inputs, config=self._run_config())
+        except Exception:
+            logger.exception("LLM request failed")
+            raise UpstreamError("Upstream LLM provider error")
+        return normalize_text(self._output_text(result, is_executor))
+
+    async def asummarize(
+        self,
+        previous: str | None,
+        messages: Iterable[dict],
+        max_tokens: int | None = None,
+    ) -> str:
+        """Fold `messages` into the running summary `previous` with the chat model."""
+        lines = [f"{item.get('role') or 'user'}: {item.get('content') or ''}" for item in messages]
+        prompt = f"Earlier summary:\n{previous or '(none)'}\n\nNew messages:\n" + ("\n".join(lines) or "(none)")
+        if max_tokens:
+            prompt += f"\n\nKeep the updated summary under {max_tokens} tokens."
+        try:
+            result = await self._runtime.llm.ainvoke(
+                [SystemMessage(content=SYSTEM_SUMMARY.strip()), HumanMessage(content=prompt)],
+                config=self._run_config(),
+            )
+        except Exception:
+            logger.exception("Summary request failed")
+            raise UpstreamError("Upstream LLM provider error")
+        return str(getattr(result, "content", "") or "").strip()
+
+    async def astream(
+        self,
+        user_message: str,
+        history: Optional[Iterable[dict]] = None,
+        context: str | None = None,
+        tools: Optional[list[BaseTool]] = None,
+        use_tools: bool = True,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Stream a reply as events: `token` text deltas, `tool_start`/`tool_end`
+        around tool calls, then one `final` event with the normalized reply.
+        """
+        runnable, is_executor = self._select_runnable(tools, use_tools)
+        inputs = self._inputs(user_message, history, context, with_scratchpad=not is_executor)
+        streamed: list[str] = []
+        final: Any = None
+        try:
+            async for event in runnable.astream_events(inputs, config=self._run_config(), version="v2"):
+                kind = event.get("event")
+                data = event.get("data") or {}
+                if kind == "on_chat_model_stream":
+                    text = getattr(data.get("chunk"), "content", "")
+                    if isinstance(text, str) and text:
+                        streamed.append(text)
+                        yield {"event": "token", "data": {"text": text}}
+                elif kind == "on_tool_start":
+                    yield {"event": "tool_start", "data": {"name": event.get("name"), "input": data.get("input")}}
+                elif kind == "on_tool_end":
+                    output = data.get("output")
+                    output_text = getattr(output, "content", output)
+                    yield {
+                        "event": "tool_end",
+                        "data": {"name": event.get("name"), "chars": len(str(output_text or ""))},
+                    }
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    final = data.get("output")
+        except Exception:
+            logger.exception("LLM streaming request failed")
+            raise UpstreamError("Upstream LLM provider error")
+
+        text = self._output_text(final, is_executor) if final is not None else ""
+        yield {"event": "final", "data": {"reply": normalize_text(text or "".join(streamed))}}
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from app.core.errors import UpstreamError
+from app.services.eodhd_client import EODHDError
+from app.services.stocks_service import StocksService, SymbolSyncResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BackfillProgress:
+    job_id: str
+    status: str
+    exchange: str
+    total_symbols: int
+    done_symbols: int
+    failed_symbols: int
+    rows: int
+    written: int
+    elapsed_seconds: float
+    rows_per_second: float
+
+
+@dataclass(frozen=True)
+class BackfillRunner:
+    """
+    Chunked, checkpointed EOD backfill for a whole exchange universe.
+
+    Every finished symbol is recorded on its chunk document in Mongo, so a
+    crashed or interrupted job resumes with `run(job_id)` and only re-fetches
+    symbols that were not yet completed.
+    """
+
+    stocks: StocksService
+    chunk_size: int = 100
+    workers: int = 2
+
+    @property
+    def jobs(self):
+        return self.stocks.mongo.db["backfill_jobs"]
+
+    @property
+    def chunks(self):
+        return self.stocks.mongo.db["backfill_chunks"]
+
+    def list_universe(self, exchange_code: str, symbol_types: Iterable[str] | None = ("Common Stock",)) -> list[str]:
+        try:
+            items = self.stocks.eodhd.exchange_symbol_list(exchange_code)
+        except EODHDError as e:
+            raise UpstreamError(f"EODHD exchange-symbol-list failed: {e}")
+        types = {t.lower() for t in symbol_types or []}
+        out: list[str] = []
+        seen: set[str] = set()
+        for item in items:
+            code = str(item.get("Code") or item.get("code") or "").strip().upper()
+            if not code:
+                continue
+            kind = str(item.get("Type") or item.get("type") or "").strip().lower()
+            if types and kind not in types:
+                continue
+            symbol = f"{code}.{exchange_code.upper()}"
+            if symbol not in seen:
+                seen.add(symbol)
+                out.append(symbol)
+        return out
+
+    def create(
+        self,
+        exchange_code: str,
+        from_date: str | None = None,
+        to_date: str | None = None,
+        period: str = "d",
+        symbols: Iterable[str] | None = None,
+        symbol_types: Iterable[str] | None = ("Common Stock",),
+        job_id: str | None = None,
+    ) -> str:
+        universe = list(symbols) if symbols is not None else self.list_universe(exchange_code, symbol_types)
+        job_id = job_id or uuid.uuid4().hex
+        size = max(int(self.chunk_size), 1)
+        chunk_docs: list[dict[str, Any]] = []
+        for idx, start in enumerate(range(0, len(universe), size)):
+            chunk_docs.append(
+                {
+                    "job_id": job_id,
+                    "chunk": idx,
+                    "symbols": universe[start : start + size],
+                    "status": "pending",
+                    "done": [],
+                    "failed": [],
+                    "errors": [],
+                    "rows": 0,
+                    "written": 0,
+                }
+            )
+        self.jobs.insert_one(
+            {
+                "_id": job_id,
+                "exchange": exchange_code.upper(),
+                "from_date": from_date,
+                "to_date": to_date,
+                "period": period,
+                "total_symbols": len(universe),
+                "chunks": len(chunk_docs),
+                "status": "pending",
+                "created_at": dt.datetime.utcnow(),
+                "elapsed_seconds": 0.0,
+            }
+        )
+        if chunk_docs:
+            self.chunks.insert_many(chunk_docs, ordered=False)
+        return job_id
+
+    def _run_chunk(self, job: dict[str, Any], chunk: dict[str, Any]) -> None:
+        chunk_filter = {"job_id": job["_id"], "chunk": chunk["chunk"]}
+        done = set(chunk.get("done") or [])
+        remaining = [s for s in chunk.get("symbols") or [] if s not in done]
+
+        def checkpoint(res: SymbolSyncResult) -> None:
+            if res.ok:
+                update = {
+                    "$addToSet": {"done": res.symbol},
+                    "$pull": {"failed": res.symbol},
+                    "$inc": {"rows": res.rows, "written": res.upserted_prices},
+                }
+            else:
+                error = {"symbol": res.symbol, "error": res.error or "failed"}
+                update = {
+                    "$addToSet": {"failed": res.symbol},
+                    "$push": {"errors": {"$each": [error], "$slice": -20}},
+                }
+            self.chunks.update_one(chunk_filter, update)
+
+        self.chunks.update_one(chunk_filter, {"$set": {"status": "running"}})
+        results = self.stocks.sync_eod_many(
+            remaining,
+            from_date=job.get("from_date"),
+            to_date=job.get("to_date"),
+            period=job.get("period") or "d",
+            on_result=checkpoint,
+        )
+        status = "done" if all(r.ok for r in results) else "partial"
+        self.chunks.update_one(chunk_filter, {"$set": {"status": status}})
+
+    def progress(self, job_id: str, elapsed_seconds: float | None = None) -> BackfillProgress | None:
+        job = self.jobs.find_one({"_id": job_id})
+        if not job:
+            return None
+        done = 0
+        failed = 0
+        rows = 0
+        written = 0
+        for chunk in self.chunks.find({"job_id": job_id}, projection={"done": 1, "failed": 1, "rows": 1, "written": 1}):
+            done += len(chunk.get("done") or [])
+            failed += len(chunk.get("failed") or [])
+            rows += int(chunk.get("rows") or 0)
+            written += int(chunk.get("written") or 0)
+        elapsed = float(job.get("elapsed_seconds") or 0.0) + float(elapsed_seconds or 0.0)
+        return BackfillProgress(
+            job_id=job_id,
+            status=str(job.get("status") or "pending"),
+            exchange=str(job.get("exchange") or ""),
+            total_symbols=int(job.get("total_symbols") or 0),
+            done_symbols=done,
+            failed_symbols=failed,
+            rows=rows,
+            written=written,
+            elapsed_seconds=round(elapsed, 3),
+            rows_per_second=round(rows / elapsed, 2) if elapsed > 0 else 0.0,
+        )
+
+    def run(
+        self,
+        job_id: str,
+        on_progress: Callable[[BackfillProgress], None] | None = None,
+    ) -> BackfillProgress:
+        job = self.jobs.find_one({"_id": job_id})
+        if not job:
+            raise ValueError(f"Unknown backfill job: {job_id}")
+
+        # Chunks are I/O bound (EODHD + Mongo) and already fan out per symbol,
+        # so a thread pool is used; Mongo/HTTP clients are not fork-safe.
+        pending = list(self.chunks.find({"job_id": job_id, "status": {"$ne": "done"}}).sort("chunk", 1))
+        self.jobs.update_one({"_id": job_id}, {"$set": {"status": "running", "started_at": dt.datetime.utcnow()}})
+        started = time.perf_counter()
+        status = "done"
+        try:
+            with ThreadPoolExecutor(max_workers=max(int(self.workers), 1), thread_name_prefix="backfill") as pool:
+                futures = [pool.submit(self._run_chunk, job, chunk) for chunk in pending]
+                for fut in as_completed(futures):
+                    fut.result()
+                    if on_progress is not None:
+                        progress = self.progress(job_id, elapsed_seconds=time.perf_counter() - started)
+                        if progress is not None:
+                            on_progress(progress)
+        except BaseException:
+            status = "interrupted"
+            raise
+        finally:
+            if status == "done" and self.chunks.count_documents({"job_id": job_id, "status": {"$ne": "done"}}):
+                status = "partial"
+            self.jobs.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {"status": status, "finished_at": dt.datetime.utcnow()},
+                    "$inc": {"elapsed_seconds": time.perf_counter() - started},
+                },
+            )
+        progress = self.progress(job_id)
+        if progress is None:
+            raise ValueError(f"Unknown backfill job: {job_id}")
+        return progress
+
+
+def main(argv: list[str] | None = None) -> None:
+    from app.core.app_logging import setup_logging
+    from app.core.config import get_settings
+    from app.core.mongo import MongoStore
+    from app.services.eodhd_client import EODHDClient
+
+    parser = argparse.ArgumentParser(description="Checkpointed multi-year EOD backfill.")
+    parser.add_argument("--exchange", default="US")
+    parser.add_argument("--from-date", default=None)
+    parser.add_argument("--to-date", default=None)
+    parser.add_argument("--resume", default=None, help="Existing job id to resume.")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    settings = get_settings()
+    token = (os.getenv(settings.eodhd.api_token_env) or settings.eodhd.api_token or "").strip()
+    if not token:
+        raise SystemExit("EODHD is not configured (missing API token).")
+    stocks = StocksService(
+        mongo=MongoStore.from_config(settings.mongo),
+        eodhd=EODHDClient.from_config(settings.eodhd, api_token=token),
+        sync_workers=settings.sync.workers,
+        bulk_chunk_size=settings.sync.bulk_chunk_size,
+    )
+    runner = BackfillRunner(
+        stocks=stocks,
+        chunk_size=settings.sync.backfill_chunk_size,
+        workers=settings.sync.backfill_workers,
+    )
+    job_id = args.resume or runner.create(args.exchange, from_date=args.from_date, to_date=args.to_date)
+    logger.info("Backfill job %s", job_id)
+
+    def report(p: BackfillProgress) -> None:
+        logger.info(
+            "backfill %s: %d/%d symbols, %d failed, %d rows, %.1f rows/s",
+            p.job_id,
+            p.done_symbols,
+            p.total_symbols,
+            p.failed_symbols,
+            p.rows,
+            p.rows_per_second,
+        )
+
+    report(runner.run(job_id, on_progress=report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import json
+import logging
+import zlib
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Stored entry layout: one header byte, then the payload.
+#   high nibble: serializer  (1 = JSON, 2 = msgpack)
+#   low nibble:  compression (0 = none, 1 = zlib, 2 = zstd)
+# Entries written before the header existed are plain JSON objects and start
+# with "{" (0x7B), which no header value uses.
+SERIALIZERS = {"json": 1, "msgpack": 2}
+COMPRESSIONS = {"none": 0, "zlib": 1, "zstd": 2}
+_LEGACY_JSON = ord("{")
+_FIELDS = ("role", "content", "id", "tokens")
+
+
+def _msgpack() -> Any:
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def _zstd() -> Any:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+class MessageCodec:
+    """
+    Versioned compact encoding for stored session messages.
+
+    Messages are serialized as a positional array (role, content, id,
+    tokens) and compressed only when the payload is at least
+    `compress_min_bytes`, where it pays for the header and dictionary cost.
+    Missing optional packages degrade to JSON / zlib.
+    """
+
+    def __init__(
+        self,
+        serializer: str = "msgpack",
+        compression: str = "zlib",
+        compress_min_bytes: int = 512,
+        level: int = 6,
+    ):
+        if serializer == "msgpack" and _msgpack() is None:
+            logger.warning("msgpack is not installed; storing session messages as JSON")
+            serializer = "json"
+        if compression == "zstd" and _zstd() is None:
+            logger.warning("zstandard is not installed; compressing session messages with zlib")
+            compression = "zlib"
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = int(compress_min_bytes)
+        self.level = int(level)
+        self._zstd_c = _zstd().ZstdCompressor(level=self.level) if compression == "zstd" else None
+        self._zstd_d = _zstd().ZstdDecompressor() if _zstd() is not None else None
+
+    def _serialize(self, row: list[Any]) -> bytes:
+        if self.serializer == "msgpack":
+            return _msgpack().packb(row, use_bin_type=True)
+        return json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def encode(self, message: dict[str, Any]) -> bytes:
+        payload = self._serialize([message.get(name) for name in _FIELDS])
+        compression = "none"
+        if self.compression != "none" and len(payload) >= self.compress_min_bytes:
+            if self._zstd_c is not None:
+                packed = self._zstd_c.compress(payload)
+            else:
+                packed = zlib.compress(payload, self.level)
+            if len(packed) < len(payload):
+                payload, compression = packed, self.compression
+        header = (SERIALIZERS[self.serializer] << 4) | COMPRESSIONS[compression]
+        return bytes([header]) + payload
+
+    def decode(self, raw: bytes | str) -> dict[str, Any]:
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        if not raw:
+            raise ValueError("empty entry")
+        header = raw[0]
+        if header == _LEGACY_JSON:
+            data = json.loads(raw)
+            if not isinstance(data, dict):
+                raise ValueError("legacy entry is not an object")
+            return data
+        serializer, compression = header >> 4, header & 0x0F
+        payload = raw[1:]
+        if compression == COMPRESSIONS["zlib"]:
+            payload = zlib.decompress(payload)
+        elif compression == COMPRESSIONS["zstd"]:
+            if self._zstd_d is None:
+                raise ValueError("zstd entry but zstandard is not installed")
+            payload = self._zstd_d.decompress(payload)
+        elif compression != COMPRESSIONS["none"]:
+            raise ValueError(f"unknown compression {compression}")
+        if serializer == SERIALIZERS["msgpack"]:
+            packer = _msgpack()
+            if packer is None:
+                raise ValueError("msgpack entry but msgpack is not installed")
+            row = packer.unpackb(payload, raw=False)
+        elif serializer == SERIALIZERS["json"]:
+            row = json.loads(payload)
+        else:
+            raise ValueError(f"unknown serializer {serializer}")
+        return dict(zip(_FIELDS, row))
+
+    @staticmethod
+    def describe(raw: bytes | str) -> str:
+        """Short label of an entry's format, for storage stats."""
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        if not raw or raw[0] == _LEGACY_JSON:
+            return "legacy-json"
+        names = {v: k for k, v in SERIALIZERS.items()}
+        packs = {v: k for k, v in COMPRESSIONS.items()}
+        return f"{names.get(raw[0] >> 4, '?')}+{packs.get(raw[0] & 0x0F, '?')}"
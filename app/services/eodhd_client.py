@@ -1,18 +1,206 @@
+import codecs
 import json
-from dataclasses import dataclass
-from typing import Any, Iterable
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from app.core import metrics
+from app.core.config import EODHDConfig
+from app.services.rate_limiter import QuotaExceeded, TokenBucket
 
 
 class EODHDError(RuntimeError):
     pass
 
 
+# API credits charged per call, keyed by the first path segment.
+DEFAULT_ENDPOINT_COSTS: dict[str, int] = {
+    "eod": 1,
+    "exchanges-list": 1,
+    "exchange-symbol-list": 1,
+    "news": 5,
+    "screener": 5,
+    "eod-bulk-last-day": 100,
+}
+
+
+def _retry_after_seconds(resp: requests.Response, default: float = 60.0) -> float:
+    try:
+        return max(float(resp.headers.get("Retry-After") or default), 1.0)
+    except ValueError:
+        return default
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Yield the elements of a top-level JSON array as its bytes arrive.
+
+    Only the unparsed tail of the body is buffered, so memory stays bounded by
+    the chunk size plus the largest single element.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    started = False
+    for chunk in _with_end_marker(chunks):
+        final = chunk is None
+        buf += utf8.decode(b"" if final else chunk, final=final)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"expected a JSON array, got {buf[pos:pos + 40]!r}")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break
+            if not final and (end >= len(buf) or buf[end] not in " \t\r\n,]"):
+                # A number cut at the chunk boundary parses as a shorter one.
+                break
+            yield value
+            pos = end
+        buf = buf[pos:]
+    raise ValueError("truncated JSON array")
+
+
+def _counted(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    for chunk in chunks:
+        metrics.BYTES.inc(len(chunk), stage="eodhd", direction="received")
+        yield chunk
+
+
+def _with_end_marker(chunks: Iterable[bytes]) -> Iterator[bytes | None]:
+    for chunk in chunks:
+        if chunk:
+            yield chunk
+    yield None
+
+
 @dataclass(frozen=True)
 class EODHDClient:
+    """
+    Thin EODHD REST client over a long-lived, pooled keep-alive session.
+
+    One instance is shared by the stocks service and the chat tools, so every
+    upstream call reuses the same connection pool.
+    """
+
     api_token: str
     base_url: str = "https://eodhd.com/api"
+    pool_connections: int = 4
+    pool_maxsize: int = 16
+    pool_block: bool = False
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    gzip: bool = True
+    rate_limit_per_minute: int = 1000
+    daily_limit: int | None = 100000
+    endpoint_costs: dict[str, int] = field(default_factory=dict, compare=False)
+    max_retries_on_429: int = 1
+    _session: requests.Session = field(init=False, repr=False, compare=False)
+    _adapter: HTTPAdapter = field(init=False, repr=False, compare=False)
+    _lock: threading.Lock = field(init=False, repr=False, compare=False, default_factory=threading.Lock)
+    _counters: dict[str, int] = field(init=False, repr=False, compare=False, default_factory=dict)
+    _credits: dict[str, int] = field(init=False, repr=False, compare=False, default_factory=dict)
+    _limiter: TokenBucket | None = field(init=False, repr=False, compare=False, default=None)
+
+    def __post_init__(self) -> None:
+        adapter = HTTPAdapter(
+            pool_connections=int(self.pool_connections),
+            pool_maxsize=int(self.pool_maxsize),
+            pool_block=bool(self.pool_block),
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["Accept-Encoding"] = "gzip, deflate" if self.gzip else "identity"
+        session.headers["Connection"] = "keep-alive"
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "_adapter", adapter)
+        if self.rate_limit_per_minute > 0:
+            limiter = TokenBucket(per_minute=self.rate_limit_per_minute, daily_limit=self.daily_limit)
+            object.__setattr__(self, "_limiter", limiter)
+
+    @classmethod
+    def from_config(cls, cfg: EODHDConfig, api_token: str) -> "EODHDClient":
+        return cls(
+            api_token=api_token,
+            base_url=cfg.base_url,
+            pool_connections=cfg.pool_connections,
+            pool_maxsize=cfg.pool_maxsize,
+            pool_block=cfg.pool_block,
+            connect_timeout=cfg.connect_timeout,
+            read_timeout=cfg.read_timeout,
+            gzip=cfg.gzip,
+            rate_limit_per_minute=cfg.rate_limit_per_minute,
+            daily_limit=cfg.daily_limit,
+            endpoint_costs=dict(cfg.endpoint_costs),
+            max_retries_on_429=cfg.max_retries_on_429,
+        )
+
+    def close(self) -> None:
+        self._session.close()
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _endpoint(self, path: str) -> str:
+        return path.strip("/").split("/", 1)[0]
+
+    def _cost(self, endpoint: str) -> int:
+        if endpoint in self.endpoint_costs:
+            return int(self.endpoint_costs[endpoint])
+        return DEFAULT_ENDPOINT_COSTS.get(endpoint, 1)
+
+    def credits(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._credits)
+
+    def stats(self) -> dict[str, Any]:
+        # urllib3 keeps per-host pools; num_connections only grows when a new
+        # TCP/TLS connection had to be opened, so the difference is reuse.
+        connections = 0
+        pooled_requests = 0
+        pools = self._adapter.poolmanager.pools
+        hosts = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts += 1
+            connections += int(getattr(pool, "num_connections", 0) or 0)
+            pooled_requests += int(getattr(pool, "num_requests", 0) or 0)
+        with self._lock:
+            counters = dict(self._counters)
+        reused = max(pooled_requests - connections, 0)
+        credits = self.credits()
+        return {
+            "requests": counters.get("requests", 0),
+            "errors": counters.get("errors", 0),
+            "throttled": counters.get("throttled", 0),
+            "credits": credits,
+            "credits_total": sum(credits.values()),
+            "rate_limit": self._limiter.snapshot() if self._limiter is not None else None,
+            "hosts": hosts,
+            "connections_opened": connections,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / pooled_requests, 4) if pooled_requests else 0.0,
+            "pool_maxsize": int(self.pool_maxsize),
+        }
 
     def _build_url(self, path: str) -> str:
         base = self.base_url
@@ -20,7 +208,12 @@ class EODHDClient:
             base = base[:-1]
         return base + "/" + path.lstrip("/")
 
-    def _get_json(self, path: str, params: dict[str, Any] | None = None) -> Any:
+    def _request(
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        stream: bool = False,
+    ) -> requests.Response:
         url = self._build_url(path)
 
         final_params: dict[str, Any] = {}
@@ -32,20 +225,63 @@ class EODHDClient:
                     continue
                 final_params[key] = value
 
-        try:
-            resp = requests.get(url, params=final_params, timeout=60)
-        except Exception as e:
-            raise EODHDError(f"EODHD request failed: {e}")
+        endpoint = self._endpoint(path)
+        cost = self._cost(endpoint)
+        attempt = 0
+        while True:
+            if self._limiter is not None:
+                try:
+                    self._limiter.acquire(cost)
+                except QuotaExceeded as e:
+                    self._count("errors")
+                    raise EODHDError(f"EODHD {e}")
+            self._count("requests")
+            with self._lock:
+                self._credits[endpoint] = self._credits.get(endpoint, 0) + cost
+            try:
+                resp = self._session.get(
+                    url,
+                    params=final_params,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                    stream=stream,
+                )
+            except Exception as e:
+                self._count("errors")
+                raise EODHDError(f"EODHD request failed: {e}")
 
-        if resp.status_code != 200:
-            snippet = (resp.text or "")[:300].replace("\n", " ")
-            raise EODHDError(f"EODHD HTTP {resp.status_code}. Body: {snippet}")
+            if resp.status_code == 429:
+                # Refused calls are not billed; only the attempt that gets
+                # through is charged.
+                with self._lock:
+                    self._credits[endpoint] -= cost
+                if self._limiter is not None:
+                    self._limiter.refund(cost)
+            if resp.status_code == 429 and attempt < self.max_retries_on_429:
+                attempt += 1
+                self._count("throttled")
+                resp.close()
+                if self._limiter is not None:
+                    self._limiter.pause(_retry_after_seconds(resp))
+                continue
 
-        try:
-            return resp.json()
-        except Exception as e:
-            snippet = (resp.text or "")[:300].replace("\n", " ")
-            raise EODHDError(f"Invalid JSON from EODHD: {e}. Body: {snippet}")
+            if resp.status_code != 200:
+                self._count("errors")
+                if stream:
+                    resp.close()
+                snippet = (resp.text or "")[:300].replace("\n", " ")
+                raise EODHDError(f"EODHD HTTP {resp.status_code}. Body: {snippet}")
+            return resp
+
+    def _get_json(self, path: str, params: dict[str, Any] | None = None) -> Any:
+        with metrics.timed(metrics.EODHD_SECONDS, "eodhd", endpoint=self._endpoint(path)):
+            resp = self._request(path, params=params)
+            metrics.BYTES.inc(len(resp.content), stage="eodhd", direction="received")
+            try:
+                return resp.json()
+            except Exception as e:
+                self._count("errors")
+                snippet = (resp.text or "")[:300].replace("\n", " ")
+                raise EODHDError(f"Invalid JSON from EODHD: {e}. Body: {snippet}")
 
     def exchanges_list(self) -> list[dict[str, Any]]:
         params = {
@@ -105,6 +341,38 @@ class EODHDClient:
             return data
         raise EODHDError("Unexpected response for eod-bulk-last-day")
 
+    def iter_eod_bulk_last_day(self, exchange_code: str, chunk_size: int = 64 * 1024) -> Iterator[dict[str, Any]]:
+        # Streaming variant of eod_bulk_last_day: rows are parsed as the body
+        # arrives instead of materializing the whole exchange in memory.
+        params = {
+            "api_token": self.api_token,
+            "fmt": "json",
+        }
+        path = f"eod-bulk-last-day/{exchange_code}"
+        # Time spent by the caller between rows (e.g. Mongo writes) is not
+        # EODHD latency, so it is left out of the observation.
+        started = time.perf_counter()
+        paused = 0.0
+        try:
+            resp = self._request(path, params=params, stream=True)
+            try:
+                for item in iter_json_array(_counted(resp.iter_content(chunk_size=chunk_size))):
+                    if isinstance(item, dict):
+                        at = time.perf_counter()
+                        yield item
+                        paused += time.perf_counter() - at
+            except (ValueError, requests.RequestException) as e:
+                self._count("errors")
+                raise EODHDError(f"Invalid JSON from EODHD: {e}")
+            finally:
+                resp.close()
+        except EODHDError as e:
+            metrics.ERRORS.inc(stage="eodhd", error=type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started - paused
+            metrics.EODHD_SECONDS.observe(elapsed, endpoint=self._endpoint(path))
+
     def news(
         self,
         symbol: str | None = None,
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_SYMBOL = re.compile(r"(?<![\w.])\$?([A-Z]{1,5}(?:\.[A-Z]{2,4})?)(?![\w])")
+_NOT_SYMBOLS = {"I", "A", "AN", "OK", "THE", "AND", "OR", "US", "EOD", "AI", "CEO", "ETF", "IPO", "USD"}
+_FILLER = (
+    "price trend volume close open high low range support momentum session "
+    "average return change market data latest window steady higher lower"
+).split()
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic, offline chat model for load tests (`openai.provider: fake`).
+
+    It never calls a network. With tools bound it requests `get_stock_context`
+    for each ticker in the user message (plus `get_stock_news` when news is
+    mentioned, `get_universe_top` for "top" questions), then answers once
+    the tool results are in. Replies depend only on the input, and timing
+    follows `latency_ms` (time to first token) and `tokens_per_second`.
+    """
+
+    latency_ms: float = 300.0
+    tokens_per_second: float = 50.0
+    reply_tokens: int = 60
+    tool_calls: bool = True
+    max_symbols: int = 3
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _last_turn(self, messages: list[BaseMessage]) -> tuple[str, list[ToolMessage]]:
+        text = ""
+        results: list[ToolMessage] = []
+        for msg in messages:
+            if isinstance(msg, HumanMessage):
+                text = str(msg.content)
+                results = []
+            elif isinstance(msg, ToolMessage):
+                results.append(msg)
+        return text, results
+
+    def _planned_calls(self, text: str, tools: list[dict[str, Any]] | None) -> list[dict[str, Any]]:
+        names = {((t.get("function") or {}).get("name")) for t in tools or []}
+        calls: list[tuple[str, dict[str, Any]]] = []
+        symbols: list[str] = []
+        for match in _SYMBOL.finditer(text):
+            sym = match.group(1)
+            if sym not in _NOT_SYMBOLS and sym not in symbols:
+                symbols.append(sym)
+        symbols = symbols[: self.max_symbols]
+        lower = text.lower()
+        if "get_stock_context" in names:
+            calls.extend(("get_stock_context", {"symbol": sym}) for sym in symbols)
+        if "get_stock_news" in names and "news" in lower:
+            calls.extend(("get_stock_news", {"symbol": sym, "limit": 3}) for sym in symbols)
+        if "get_universe_top" in names and not symbols and "top" in lower:
+            calls.append(("get_universe_top", {"limit": 10}))
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=4).hexdigest()
+        return [
+            {"name": name, "args": args, "id": f"call_{digest}_{i}"} for i, (name, args) in enumerate(calls)
+        ]
+
+    def _reply(self, text: str, results: list[ToolMessage]) -> str:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+        head = f"(fake) Re: {' '.join(text.split()[:12])}."
+        if results:
+            chars = sum(len(str(r.content)) for r in results)
+            head += f" Used {len(results)} tool results ({chars} chars)."
+        words = head.split()
+        while len(words) < self.reply_tokens:
+            words.append(_FILLER[seed % len(_FILLER)])
+            seed = (seed * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        return " ".join(words[: max(self.reply_tokens, len(head.split()))])
+
+    def _plan(self, messages: list[BaseMessage], kwargs: dict[str, Any]) -> tuple[str, list[dict[str, Any]]]:
+        text, results = self._last_turn(messages)
+        if self.tool_calls and not results:
+            calls = self._planned_calls(text, kwargs.get("tools"))
+            if calls:
+                return "", calls
+        return self._reply(text, results), []
+
+    def _pieces(self, content: str) -> list[str]:
+        words = content.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)] if content else []
+
+    def _timing(self) -> tuple[float, float]:
+        # (seconds to the first token, seconds per further token)
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return self.latency_ms / 1000.0, per_token
+
+    def _total_seconds(self, content: str, calls: list[dict[str, Any]]) -> float:
+        first, per_token = self._timing()
+        tokens = len(self._pieces(content)) or len(calls)
+        return first + per_token * max(tokens - 1, 0)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        content, calls = self._plan(messages, kwargs)
+        time.sleep(self._total_seconds(content, calls))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content, tool_calls=calls))])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        content, calls = self._plan(messages, kwargs)
+        await asyncio.sleep(self._total_seconds(content, calls))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content, tool_calls=calls))])
+
+    def _chunks(self, content: str, calls: list[dict[str, Any]]) -> list[AIMessageChunk]:
+        if calls:
+            return [
+                AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        tool_call_chunk(name=c["name"], args=json.dumps(c["args"]), id=c["id"], index=i)
+                    ],
+                )
+                for i, c in enumerate(calls)
+            ]
+        return [AIMessageChunk(content=piece) for piece in self._pieces(content)]
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        content, calls = self._plan(messages, kwargs)
+        first, rest = self._timing()
+        time.sleep(first)
+        for i, chunk in enumerate(self._chunks(content, calls)):
+            if i:
+                time.sleep(rest)
+            if run_manager and isinstance(chunk.content, str) and chunk.content:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        content, calls = self._plan(messages, kwargs)
+        first, rest = self._timing()
+        await asyncio.sleep(first)
+        for i, chunk in enumerate(self._chunks(content, calls)):
+            if i:
+                await asyncio.sleep(rest)
+            if run_manager and isinstance(chunk.content, str) and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
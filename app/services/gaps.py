@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+from app.services.stocks_service import StocksService, SymbolSyncResult
+from app.services.trading_calendar import TradingCalendar
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SymbolCoverage:
+    symbol: str
+    exchange: str
+    first_date: str | None
+    last_date: str | None
+    expected: int
+    present: int
+    missing: int
+    ranges: list[tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def coverage_pct(self) -> float:
+        if not self.expected:
+            return 100.0
+        return round(100.0 * (self.expected - self.missing) / self.expected, 2)
+
+
+@dataclass(frozen=True)
+class ExchangeCoverage:
+    exchange: str
+    symbols: int
+    symbols_with_gaps: int
+    expected: int
+    missing: int
+
+    @property
+    def coverage_pct(self) -> float:
+        if not self.expected:
+            return 100.0
+        return round(100.0 * (self.expected - self.missing) / self.expected, 2)
+
+
+@dataclass(frozen=True)
+class GapReport:
+    from_date: str
+    to_date: str
+    symbols: list[SymbolCoverage]
+    exchanges: list[ExchangeCoverage]
+
+    @property
+    def requests(self) -> int:
+        return sum(len(s.ranges) for s in self.symbols)
+
+
+def _exchange_of(symbol: str) -> str:
+    return symbol.rsplit(".", 1)[1].upper() if "." in symbol else "US"
+
+
+@dataclass(frozen=True)
+class GapScanner:
+    """
+    Finds missing trading days in prices_daily and fills them with the
+    fewest EODHD `eod` range requests.
+
+    Every eod call costs the same credit regardless of its span, so gaps no
+    more than `merge_within_days` trading days apart share one request.
+    """
+
+    stocks: StocksService
+    merge_within_days: int = 20
+    lookback_days: int = 365
+
+    def _calendar(self, exchange: str, cache: dict[str, TradingCalendar]) -> TradingCalendar:
+        if exchange not in cache:
+            cache[exchange] = TradingCalendar(exchange)
+        return cache[exchange]
+
+    def _ranges(self, missing: list[dt.date], expected: list[dt.date]) -> list[tuple[str, str]]:
+        if not missing:
+            return []
+        index = {day: i for i, day in enumerate(expected)}
+        ranges: list[tuple[dt.date, dt.date]] = []
+        start = prev = missing[0]
+        for day in missing[1:]:
+            if index[day] - index[prev] - 1 <= self.merge_within_days:
+                prev = day
+                continue
+            ranges.append((start, prev))
+            start = prev = day
+        ranges.append((start, prev))
+        return [(a.isoformat(), b.isoformat()) for a, b in ranges]
+
+    def scan(
+        self,
+        symbols: Iterable[str] | None = None,
+        from_date: str | None = None,
+        to_date: str | None = None,
+    ) -> GapReport:
+        wanted = [s for s in (symbols or []) if s]
+        if not wanted:
+            wanted = sorted(self.stocks.prices.distinct("symbol"))
+        today = dt.date.today()
+        start = dt.date.fromisoformat(from_date) if from_date else today - dt.timedelta(days=self.lookback_days)
+        calendars: dict[str, TradingCalendar] = {}
+
+        # One aggregation returns every stored date per symbol in the window.
+        # The first stored bar comes from a separate, unwindowed lookup: with
+        # the window's own minimum, bars missing at the start of the window
+        # would look like the listing date and never be reported.
+        pipeline = [
+            {"$match": {"symbol": {"$in": wanted}, "date": {"$gte": start.isoformat()}}},
+            {
+                "$group": {
+                    "_id": "$symbol",
+                    "last": {"$max": "$date"},
+                    "dates": {"$addToSet": "$date"},
+                }
+            },
+        ]
+        if to_date:
+            pipeline[0]["$match"]["date"]["$lte"] = to_date
+        stored: dict[str, dict[str, Any]] = {}
+        for doc in self.stocks.prices.aggregate(pipeline, allowDiskUse=True):
+            stored[str(doc["_id"])] = doc
+        first_dates = self.stocks.first_dates(wanted)
+
+        coverage: list[SymbolCoverage] = []
+        for symbol in wanted:
+            exchange = _exchange_of(symbol)
+            cal = self._calendar(exchange, calendars)
+            # Today's bar may not be published yet, so the default end is the
+            # previous trading day.
+            end = dt.date.fromisoformat(to_date) if to_date else cal.previous_trading_day(today)
+            first_date = first_dates.get(symbol)
+            if not first_date:
+                coverage.append(
+                    SymbolCoverage(symbol, exchange, None, None, expected=0, present=0, missing=0)
+                )
+                continue
+            doc = stored.get(symbol) or {}
+            present = {str(d)[:10] for d in doc.get("dates") or []}
+            first = dt.date.fromisoformat(first_date[:10])
+            # Days before the first stored bar are not counted (listing date
+            # or backfill start); use the backfill job for those.
+            expected = cal.trading_days(max(first, start), end)
+            missing = [day for day in expected if day.isoformat() not in present]
+            coverage.append(
+                SymbolCoverage(
+                    symbol=symbol,
+                    exchange=exchange,
+                    first_date=first_date,
+                    last_date=str(doc["last"]) if doc.get("last") else None,
+                    expected=len(expected),
+                    present=len(expected) - len(missing),
+                    missing=len(missing),
+                    ranges=self._ranges(missing, expected),
+                )
+            )
+
+        by_exchange: dict[str, list[SymbolCoverage]] = {}
+        for item in coverage:
+            by_exchange.setdefault(item.exchange, []).append(item)
+        exchanges = [
+            ExchangeCoverage(
+                exchange=exchange,
+                symbols=len(items),
+                symbols_with_gaps=sum(1 for i in items if i.missing),
+                expected=sum(i.expected for i in items),
+                missing=sum(i.missing for i in items),
+            )
+            for exchange, items in sorted(by_exchange.items())
+        ]
+        return GapReport(
+            from_date=start.isoformat(),
+            to_date=to_date or today.isoformat(),
+            symbols=coverage,
+            exchanges=exchanges,
+        )
+
+    def fill(
+        self,
+        report: GapReport,
+        on_result: Callable[[SymbolSyncResult], None] | None = None,
+    ) -> list[SymbolSyncResult]:
+        tasks = [(item.symbol, a, b) for item in report.symbols for a, b in item.ranges]
+        if not tasks:
+            return []
+        results: list[SymbolSyncResult] = []
+        workers = max(1, min(int(self.stocks.sync_workers), len(tasks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gap-fill") as pool:
+            futures = [pool.submit(self.stocks.sync_eod_range, symbol, a, b, "d") for symbol, a, b in tasks]
+            for fut in futures:
+                res = fut.result()
+                results.append(res)
+                if not res.ok:
+                    logger.warning("Gap fill failed for %s: %s", res.symbol, res.error)
+                if on_result is not None:
+                    on_result(res)
+        return results
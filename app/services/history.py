@@ -0,0 +1,121 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from app.services.agent import ConversationAgent
+from app.services.session_cache import SessionCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HistoryWindow:
+    messages: list[dict[str, Any]] = field(default_factory=list)
+    summary: str | None = None
+    tokens: int = 0
+    folded: int = 0
+
+
+class HistoryBuilder:
+    """
+    Token-budgeted history for the next LLM call.
+
+    Recent turns are kept while they fit in `token_budget`. Once a session
+    goes over budget, the oldest unfolded turns are folded into a rolling
+    summary stored next to the session (`...:summary`, with the id of the
+    last folded message) until the kept turns use half the budget. The next
+    few turns then fit again, so the summary is only rewritten in batches.
+
+    Turns that the next append would trim from Redis (`max_messages`) are
+    folded first even when the window still fits, so none are lost unsummarized.
+    """
+
+    def __init__(
+        self,
+        cache: SessionCache,
+        agent: ConversationAgent,
+        token_budget: int,
+        summarize: bool = True,
+        token_counter: Callable[[str], int] | None = None,
+        max_messages: int | None = None,
+        turn_messages: int = 2,
+    ):
+        self.cache = cache
+        self.agent = agent
+        self.token_budget = int(token_budget)
+        self.summarize = summarize
+        self.token_counter = token_counter or cache.token_counter
+        self.max_messages = int(max_messages if max_messages is not None else cache.max_messages)
+        self.turn_messages = int(turn_messages)
+
+    def _keep_newest(self, messages: list[dict[str, Any]], budget: int) -> list[dict[str, Any]]:
+        kept = 0
+        used = 0
+        for item in reversed(messages):
+            if used + int(item["tokens"]) > budget:
+                break
+            used += int(item["tokens"])
+            kept += 1
+        return messages[len(messages) - kept :]
+
+    def _fit(self, text: str, limit: int) -> tuple[str, int]:
+        # Last resort when the summarizer overshoots: cut the text to `limit`.
+        tokens = self.token_counter(text)
+        while text and tokens > limit:
+            text = text[: int(len(text) * limit / tokens * 0.9)].rstrip()
+            tokens = self.token_counter(text) if text else 0
+        return text, tokens
+
+    def _window(self, messages: list[dict[str, Any]], summary: dict[str, Any] | None, folded: int) -> HistoryWindow:
+        out = list(messages)
+        tokens = sum(int(m["tokens"]) for m in messages)
+        text = None
+        if summary:
+            text = str(summary["text"])
+            tokens += int(summary.get("tokens") or 0)
+            out.insert(0, {"role": "system", "content": f"Summary of the earlier conversation:\n{text}"})
+        return HistoryWindow(messages=out, summary=text, tokens=tokens, folded=folded)
+
+    async def abuild(self, session_id: str, history: list[dict[str, Any]]) -> HistoryWindow:
+        summary = await self.cache.aget_summary(session_id) if self.summarize else None
+        through_id = int(summary.get("through_id", -1)) if summary else -1
+        pending = [m for m in history if int(m.get("id") or 0) > through_id]
+        summary_tokens = int(summary.get("tokens") or 0) if summary else 0
+        over_budget = summary_tokens + sum(int(m["tokens"]) for m in pending) > self.token_budget
+
+        # Unfolded messages the next append's LTRIM drops (pending is oldest first).
+        trimmed = history[: max(len(history) + self.turn_messages - self.max_messages, 0)]
+        at_risk = sum(1 for m in trimmed if int(m.get("id") or 0) > through_id)
+
+        if not over_budget and not (self.summarize and at_risk):
+            return self._window(pending, summary, folded=0)
+
+        if not self.summarize:
+            return self._window(self._keep_newest(pending, self.token_budget), None, folded=0)
+
+        kept = self._keep_newest(pending, self.token_budget // 2) if over_budget else pending
+        fold = max(len(pending) - len(kept), at_risk)
+        to_fold, kept = pending[:fold], pending[fold:]
+        room = max(self.token_budget - sum(int(m["tokens"]) for m in kept), 1)
+        if not to_fold and summary is None:
+            return self._window(kept, None, folded=0)
+
+        # With nothing to fold the summary itself is over budget: re-compress it.
+        previous = summary if summary_tokens <= room else None
+        try:
+            text = await self.agent.asummarize(
+                summary["text"] if summary else None, to_fold, max_tokens=max(room // 2, 1)
+            )
+        except Exception:
+            # Keep serving within budget; the fold is retried next turn.
+            logger.warning("History summarization failed for session %s", session_id, exc_info=True)
+            return self._window(kept, previous, folded=0)
+        if not text:
+            return self._window(kept, previous, folded=0)
+
+        text, tokens = self._fit(text, room)
+        last_id = int(to_fold[-1].get("id") or 0) if to_fold else through_id
+        summary = {"text": text, "through_id": last_id, "tokens": tokens}
+        await self.cache.aset_summary(session_id, **summary)
+        logger.info("Folded %d messages into the summary of session %s", len(to_fold), session_id)
+        return self._window(kept, summary, folded=len(to_fold))
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from pymongo.errors import PyMongoError
+
+from app.services.stocks_service import PriceWriteResult, SymbolSyncResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: dict[str, Any] = field(default_factory=dict)
+    status: str = "queued"
+    total: int | None = None
+    done: int = 0
+    failed: int = 0
+    rows_written: int = 0
+    errors: list[str] = field(default_factory=list)
+    result: dict[str, Any] | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return round(end - self.started_at, 3)
+
+    def to_doc(self) -> dict[str, Any]:
+        return {
+            "_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "rows_written": self.rows_written,
+            "errors": list(self.errors),
+            "result": self.result,
+            "created_at": dt.datetime.utcfromtimestamp(self.created_at),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": self.elapsed_seconds(),
+            "heartbeat_at": dt.datetime.utcnow(),
+        }
+
+
+class JobHandle:
+    """
+    Progress reporter handed to a running job function.
+    """
+
+    max_errors = 50
+
+    def __init__(self, job: Job, manager: "JobManager"):
+        self._job = job
+        self._manager = manager
+
+    def set_total(self, total: int) -> None:
+        with self._manager.lock:
+            self._job.total = int(total)
+        self._manager.persist(self._job)
+
+    def on_symbol(self, res: SymbolSyncResult) -> None:
+        with self._manager.lock:
+            self._job.done += 1
+            self._job.rows_written += res.upserted_prices
+            if not res.ok:
+                self._job.failed += 1
+                if len(self._job.errors) < self.max_errors:
+                    self._job.errors.append(f"{res.symbol}: {res.error}")
+        self._manager.persist(self._job)
+
+    def on_rows(self, res: PriceWriteResult) -> None:
+        with self._manager.lock:
+            self._job.done += res.inserted + res.changed + res.unchanged
+            self._job.rows_written += res.written
+        self._manager.persist(self._job)
+
+
+class JobManager:
+    """
+    Runs long sync work on a small dedicated executor and tracks its progress.
+
+    The executor size caps how many syncs run at once, independent of the
+    request threadpool, so background syncs cannot starve chat traffic.
+    Job state is mirrored to Mongo so any worker process can answer a status
+    poll. Unfinished jobs carry a `heartbeat_at` refreshed every
+    `heartbeat_interval`; once it goes stale the process running them is
+    gone, and the job is marked `interrupted` (see `recover_interrupted`).
+    """
+
+    def __init__(
+        self,
+        collection: Any | None = None,
+        max_concurrent: int = 2,
+        persist_interval: float = 1.0,
+        max_jobs_kept: int = 200,
+        heartbeat_interval: float = 30.0,
+    ):
+        self.collection = collection
+        self.persist_interval = persist_interval
+        self.max_jobs_kept = max_jobs_kept
+        self.heartbeat_interval = heartbeat_interval
+        self.lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._persisted_at: dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(int(max_concurrent), 1), thread_name_prefix="sync-job")
+        self._stop = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+        if collection is not None:
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="sync-job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(timeout=self.heartbeat_interval):
+            with self.lock:
+                live = [job.id for job in self._jobs.values() if job.finished_at is None]
+            if not live:
+                continue
+            try:
+                self.collection.update_many(
+                    {"_id": {"$in": live}, "status": {"$in": ["queued", "running"]}},
+                    {"$set": {"heartbeat_at": dt.datetime.utcnow()}},
+                )
+            except PyMongoError:
+                logger.warning("Could not refresh job heartbeats", exc_info=True)
+
+    def _interrupt_stale(self, query: dict[str, Any]) -> int:
+        # Three missed heartbeats: the owning process has stopped.
+        cutoff = dt.datetime.utcnow() - dt.timedelta(seconds=3 * self.heartbeat_interval)
+        res = self.collection.update_many(
+            {
+                **query,
+                "status": {"$in": ["queued", "running"]},
+                "$or": [{"heartbeat_at": {"$lt": cutoff}}, {"heartbeat_at": {"$exists": False}}],
+            },
+            {
+                "$set": {"status": "interrupted", "finished_at": time.time()},
+                "$push": {"errors": "interrupted: the process running this job stopped"},
+            },
+        )
+        return int(res.modified_count)
+
+    def recover_interrupted(self) -> int:
+        """Mark jobs left queued/running by a stopped process as interrupted."""
+        if self.collection is None:
+            return 0
+        try:
+            count = self._interrupt_stale({})
+        except PyMongoError:
+            logger.warning("Could not recover interrupted jobs", exc_info=True)
+            return 0
+        if count:
+            logger.warning("Marked %d jobs from a stopped process as interrupted", count)
+        return count
+
+    def persist(self, job: Job, force: bool = False) -> None:
+        if self.collection is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self._persisted_at.get(job.id, 0.0) < self.persist_interval:
+                return
+            self._persisted_at[job.id] = now
+            doc = job.to_doc()
+        try:
+            self.collection.replace_one({"_id": job.id}, doc, upsert=True)
+        except PyMongoError:
+            logger.warning("Could not persist job %s", job.id, exc_info=True)
+
+    def submit(self, kind: str, fn: Callable[[JobHandle], dict[str, Any]], params: dict[str, Any] | None = None) -> Job:
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=dict(params or {}))
+        with self.lock:
+            self._jobs[job.id] = job
+            finished = [j for j in self._jobs.values() if j.finished_at is not None]
+            for old in sorted(finished, key=lambda j: j.created_at)[: max(len(self._jobs) - self.max_jobs_kept, 0)]:
+                self._jobs.pop(old.id, None)
+        self.persist(job, force=True)
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[JobHandle], dict[str, Any]]) -> None:
+        with self.lock:
+            job.status = "running"
+            job.started_at = time.time()
+        self.persist(job, force=True)
+        try:
+            result = fn(JobHandle(job, self))
+            with self.lock:
+                job.result = result
+                job.status = "done"
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            with self.lock:
+                job.status = "failed"
+                job.errors.append(str(getattr(e, "detail", None) or e))
+        finally:
+            with self.lock:
+                job.finished_at = time.time()
+            self.persist(job, force=True)
+            with self.lock:
+                self._persisted_at.pop(job.id, None)
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        with self.lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_doc()
+        if self.collection is None:
+            return None
+        doc = self.collection.find_one({"_id": job_id})
+        if doc and doc.get("status") in ("queued", "running") and self._interrupt_stale({"_id": job_id}):
+            doc = self.collection.find_one({"_id": job_id})
+        return doc
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
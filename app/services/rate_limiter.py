@@ -0,0 +1,91 @@
+import datetime as dt
+import threading
+import time
+from typing import Any
+
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """
+    Credit-based token bucket with an optional daily cap.
+
+    State is guarded by a plain lock and never held across a sleep, so one
+    bucket can be shared by worker threads.
+    """
+
+    def __init__(self, per_minute: int, daily_limit: int | None = None, burst: int | None = None):
+        self.rate = max(float(per_minute), 1.0) / 60.0
+        self.capacity = float(burst or per_minute)
+        self.daily_limit = int(daily_limit) if daily_limit else None
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._day = dt.datetime.utcnow().date()
+        self._day_used = 0
+        self._waited_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+        today = dt.datetime.utcnow().date()
+        if today != self._day:
+            self._day = today
+            self._day_used = 0
+
+    def _try_take(self, cost: int) -> float:
+        # Returns 0 when the credits were taken, otherwise seconds to wait.
+        # Costs larger than the bucket are let through once it is full and
+        # leave it in debt, so oversized requests are never starved.
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            if self.daily_limit is not None and self._day_used + cost > self.daily_limit:
+                raise QuotaExceeded(
+                    f"daily credit limit reached ({self._day_used}/{self.daily_limit})"
+                )
+            needed = min(float(cost), self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= cost
+                self._day_used += cost
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    def acquire(self, cost: int = 1) -> None:
+        while True:
+            wait = self._try_take(cost)
+            if wait <= 0:
+                return
+            with self._lock:
+                self._waited_seconds += wait
+            time.sleep(wait)
+
+    def refund(self, cost: int) -> None:
+        # The upstream refused the call (429), so it did not use daily credits.
+        # The per-minute tokens are not returned; pause() empties them anyway.
+        with self._lock:
+            self._day_used = max(self._day_used - int(cost), 0)
+
+    def pause(self, seconds: float) -> None:
+        # Called after an upstream 429: stop handing out credits for a while.
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+            self._paused_until = max(self._paused_until, self._updated + max(seconds, 0.0))
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "per_minute": round(self.rate * 60.0),
+                "available": round(self._tokens, 2),
+                "daily_used": self._day_used,
+                "daily_limit": self.daily_limit,
+                "waited_seconds": round(self._waited_seconds, 3),
+            }
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import string
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+from app.core import metrics
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis as AsyncRedis
+
+logger = logging.getLogger(__name__)
+
+_TRAILING = string.punctuation + string.whitespace
+
+
+def normalize_question(text: str) -> str:
+    return " ".join((text or "").lower().split()).strip(_TRAILING)
+
+
+def _fingerprint(value: Any) -> str:
+    raw = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    Redis-backed cache of final chat replies.
+
+    The key covers the normalized question, the history and context the model
+    sees, the agent runtime (model, prompt, tools) and the prices_daily data
+    version, so a sync that writes new bars makes older entries unreachable;
+    they then expire by TTL.
+    """
+
+    def __init__(self, aredis: "AsyncRedis", key_prefix: str, ttl_seconds: int):
+        self.aredis = aredis
+        self.key_prefix = (key_prefix or "").strip(":") or "conv-agent"
+        self.ttl_seconds = ttl_seconds
+        self._counts = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def key(
+        self,
+        message: str,
+        history: Optional[Iterable[dict]],
+        context: str | None,
+        agent_fingerprint: str,
+        data_version: str,
+    ) -> str:
+        turns = [(item.get("role"), item.get("content")) for item in history or []]
+        digest = _fingerprint(
+            {
+                "q": normalize_question(message),
+                "history": turns,
+                "context": (context or "").strip(),
+                "agent": agent_fingerprint,
+                "data": data_version,
+            }
+        )
+        return f"{self.key_prefix}:llm-cache:{digest}"
+
+    async def aget(self, key: str) -> str | None:
+        try:
+            value = await self.aredis.get(key)
+        except Exception:
+            # A cache outage must not fail the chat; treat it as a miss.
+            logger.warning("Response cache read failed", exc_info=True)
+            self._counts["errors"] += 1
+            metrics.ERRORS.inc(stage="response_cache", error="read")
+            value = None
+        if value is None:
+            self._counts["misses"] += 1
+            metrics.CACHE_REQUESTS.inc(cache="response", result="miss")
+            return None
+        self._counts["hits"] += 1
+        metrics.CACHE_REQUESTS.inc(cache="response", result="hit")
+        return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+    async def aset(self, key: str, reply: str) -> None:
+        if not reply:
+            return
+        try:
+            await self.aredis.set(key, reply, ex=self.ttl_seconds)
+            self._counts["stores"] += 1
+        except Exception:
+            logger.warning("Response cache write failed", exc_info=True)
+            self._counts["errors"] += 1
+            metrics.ERRORS.inc(stage="response_cache", error="write")
+
+    def stats(self) -> dict[str, Any]:
+        out: dict[str, Any] = dict(self._counts)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
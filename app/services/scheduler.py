@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any
+from zoneinfo import ZoneInfo
+
+from app.core.config import SchedulerConfig
+from app.services.stock_tools import ToolMemo, warm_tool_memo
+from app.services.stocks_service import StocksService
+
+if TYPE_CHECKING:
+    from redis import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class DailyRefreshScheduler:
+    """
+    In-process scheduler for the post-close bulk-last-day refresh.
+
+    Every worker runs the timer, but only the one that wins a per-day Redis
+    lock (SET NX EX) performs the refresh. Afterwards every worker warms its
+    own tool memo; the others wait for the leader's done marker first.
+    """
+
+    # How often a worker that lost the lock checks for the leader's done marker.
+    leader_poll_seconds = 15.0
+
+    def __init__(
+        self,
+        cfg: SchedulerConfig,
+        stocks: StocksService,
+        redis: "Redis",
+        key_prefix: str,
+        memo: ToolMemo | None = None,
+    ):
+        self.cfg = cfg
+        self.stocks = stocks
+        self.redis = redis
+        self.memo = memo
+        self.key_prefix = (key_prefix or "").strip(":") or "conv-agent"
+        self.tz = ZoneInfo(cfg.timezone)
+        self.worker_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="daily-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def next_run(self, now: dt.datetime | None = None) -> dt.datetime:
+        now = (now or dt.datetime.now(self.tz)).astimezone(self.tz)
+        hour, minute = (int(part) for part in self.cfg.run_at.split(":", 1))
+        candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= now:
+            candidate += dt.timedelta(days=1)
+        while self.cfg.weekdays_only and candidate.weekday() >= 5:
+            candidate += dt.timedelta(days=1)
+        return candidate
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            run_at = self.next_run()
+            jitter = random.uniform(0, float(self.cfg.jitter_seconds))
+            delay = (run_at - dt.datetime.now(self.tz)).total_seconds() + jitter
+            logger.info("Next bulk refresh at %s (+%.0fs jitter)", run_at.isoformat(), jitter)
+            if self._stop.wait(timeout=max(delay, 0.0)):
+                return
+            try:
+                self.run_once(run_at.date())
+            except Exception:
+                logger.exception("Scheduled bulk refresh failed")
+
+    def _lock_key(self, trading_date: dt.date) -> str:
+        return f"{self.key_prefix}:scheduler:bulk-refresh:{trading_date.isoformat()}"
+
+    def _acquire_lock(self, trading_date: dt.date) -> bool:
+        key = self._lock_key(trading_date)
+        return bool(self.redis.set(key, self.worker_id, nx=True, ex=int(self.cfg.lock_ttl_seconds)))
+
+    def _mark_done(self, trading_date: dt.date) -> None:
+        self.redis.set(self._lock_key(trading_date) + ":done", self.worker_id, ex=int(self.cfg.lock_ttl_seconds))
+
+    def _wait_for_leader(self, trading_date: dt.date) -> bool:
+        deadline = time.monotonic() + float(self.cfg.lock_ttl_seconds)
+        key = self._lock_key(trading_date) + ":done"
+        while time.monotonic() < deadline:
+            if self.redis.exists(key):
+                return True
+            if self._stop.wait(timeout=self.leader_poll_seconds):
+                return False
+        return False
+
+    def warm(self) -> int:
+        # Fill this worker's tool memo with the universe ranking and the
+        # context blocks of each exchange's top symbols, so the first chats
+        # after the refresh do not rebuild them from Mongo.
+        limit = int(self.cfg.warm_symbols)
+        if self.memo is None or limit <= 0:
+            return 0
+        symbols: list[str] = []
+        for exchange in self.cfg.exchanges:
+            symbols += self.stocks.top_universe_symbols(limit=limit, exchange=exchange)
+        warmed = warm_tool_memo(self.memo, self.stocks, symbols, ttl_seconds=self.cfg.warm_ttl_seconds)
+        logger.info("Warmed %d tool memo entries", warmed)
+        return warmed
+
+    def run_once(self, trading_date: dt.date | None = None, force: bool = False) -> dict[str, Any] | None:
+        trading_date = trading_date or dt.datetime.now(self.tz).date()
+        if not force and not self._acquire_lock(trading_date):
+            logger.info("Bulk refresh for %s is owned by another worker", trading_date)
+            if self.memo is not None and self._wait_for_leader(trading_date):
+                self.warm()
+            return None
+
+        started = time.perf_counter()
+        summary: dict[str, Any] = {"date": trading_date.isoformat(), "exchanges": {}}
+        for exchange in self.cfg.exchanges:
+            try:
+                symbols = None
+                if self.cfg.universe_limit:
+                    symbols = self.stocks.top_universe_symbols(limit=self.cfg.universe_limit, exchange=exchange)
+                    if not symbols:
+                        logger.warning("No stored universe for %s; skipping its bulk refresh", exchange)
+                        summary["exchanges"][exchange] = {"skipped": "no stored universe"}
+                        continue
+                res = self.stocks.sync_bulk_last_day(exchange_code=exchange, symbols=symbols)
+            except Exception as e:
+                logger.exception("Bulk refresh failed for %s", exchange)
+                summary["exchanges"][exchange] = {"error": str(getattr(e, "detail", None) or e)}
+                continue
+            summary["exchanges"][exchange] = {
+                "inserted": res.inserted,
+                "changed": res.changed,
+                "unchanged": res.unchanged,
+            }
+        if not force:
+            self._mark_done(trading_date)
+        try:
+            summary["warmed"] = self.warm()
+        except Exception:
+            logger.exception("Tool memo warm-up failed")
+        summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info("Bulk refresh done: %s", summary)
+        return summary
@@ -1,53 +1,477 @@
-from typing import TYPE_CHECKING, cast
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Iterable, Optional, cast
+
+from app.core import metrics
+from app.core.config import RedisConfig
+from app.core.redis_pool import build_redis_clients
+from app.services.codec import MessageCodec
+from app.services.tokens import count_tokens
 
 if TYPE_CHECKING:
     from redis import Redis
+    from redis.asyncio import Redis as AsyncRedis
+
+logger = logging.getLogger(__name__)
+
+
+class _HistoryL1:
+    """
+    Bounded LRU of decoded session histories for this process.
+
+    Entries are only served while `active` (the invalidation subscriber is
+    connected). Each invalidation moves that session's generation on, so a
+    read that raced with a write elsewhere does not store a stale list.
+    """
+
+    def __init__(self, max_sessions: int, max_age_seconds: float):
+        self.max_sessions = int(max_sessions)
+        self.max_age_seconds = float(max_age_seconds)
+        self.active = False
+        self._epoch = 0
+        self._generations: dict[str, int] = {}
+        self._entries: OrderedDict[str, tuple[float, list[dict[str, Any]]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0 and self.active
+
+    def generation(self, session_id: str) -> tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations.get(session_id, 0)
+
+    def get(self, session_id: str) -> list[dict[str, Any]] | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[session_id]
+                self._counts["misses"] += 1
+                metrics.CACHE_REQUESTS.inc(cache="session_l1", result="miss")
+                return None
+            self._entries.move_to_end(session_id)
+            self._counts["hits"] += 1
+        metrics.CACHE_REQUESTS.inc(cache="session_l1", result="hit")
+        return list(entry[1])
+
+    def put(self, session_id: str, history: list[dict[str, Any]], generation: tuple[int, int]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != (self._epoch, self._generations.get(session_id, 0)):
+                return
+            self._entries[session_id] = (time.monotonic() + self.max_age_seconds, list(history))
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            if len(self._generations) > 10 * max(self.max_sessions, 1):
+                # Bound the bookkeeping; a new epoch voids in-flight reads.
+                self._generations.clear()
+                self._epoch += 1
+            self._generations[session_id] = self._generations.get(session_id, 0) + 1
+            if self._entries.pop(session_id, None) is not None:
+                self._counts["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            out: dict[str, Any] = dict(self._counts)
+            out["sessions"] = len(self._entries)
+        out["active"] = self.enabled
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
 
 
 class SessionCache:
     """
     Redis-backed session cache with TTL and max history length.
-    """
 
-    def __init__(self, redis_url: str, key_prefix: str, ttl_seconds: int, max_messages: int):
-        import redis  # local import so py_compile works without the dependency installed
+    Sync methods serve threadpool endpoints and background jobs; the `a*`
+    variants use the asyncio client so async endpoints never block the loop.
+    Each stored message carries an increasing `id` and its token count, so
+    history windowing never re-tokenizes old turns.
+
+    Decoded histories are also kept in a per-process LRU. Every write
+    publishes the session id on `<prefix>:session-invalidate` in the same
+    MULTI/EXEC (right after it in cluster mode); other workers drop their
+    copy when it arrives.
+    """
 
+    def __init__(
+        self,
+        redis_url: str,
+        key_prefix: str,
+        ttl_seconds: int,
+        max_messages: int,
+        token_counter: Callable[[str], int] = count_tokens,
+        l1_max_sessions: int = 0,
+        l1_max_age_seconds: float = 30.0,
+        codec: MessageCodec | None = None,
+        redis_cfg: RedisConfig | None = None,
+    ):
+        redis_cfg = redis_cfg or RedisConfig()
         self.ttl_seconds = ttl_seconds
         self.max_messages = max_messages
+        self.token_counter = token_counter
         self.key_prefix = (key_prefix or "").strip(":") or "conv-agent"
-        self.redis: "Redis" = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.codec = codec or MessageCodec()
+        self.cluster = redis_cfg.cluster
+        # Binary-safe clients: session entries are compact bytes, not text.
+        # Other users of these clients decode string values themselves.
+        clients = build_redis_clients(redis_url, redis_cfg)
+        self.redis: "Redis" = clients[0]
+        self.aredis: "AsyncRedis" = clients[1]
+        self.worker_id = uuid.uuid4().hex
+        self.invalidation_channel = f"{self.key_prefix}:session-invalidate"
+        self.l1 = _HistoryL1(l1_max_sessions, l1_max_age_seconds)
+        self._listener: asyncio.Task | None = None
 
     def ping(self) -> bool:
         return bool(self.redis.ping())
 
+    def start_listener(self) -> None:
+        """Start the invalidation subscriber; the L1 serves reads only while it is connected."""
+        if self.l1.max_sessions > 0 and self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.aredis.pubsub()
+            try:
+                await pubsub.subscribe(self.invalidation_channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "subscribe":
+                        # Anything cached before (re)subscribing may have missed
+                        # invalidations.
+                        self.l1.clear()
+                        self.l1.active = True
+                        continue
+                    if message.get("type") != "message":
+                        continue
+                    data = message.get("data") or b""
+                    if isinstance(data, bytes):
+                        data = data.decode("utf-8", "replace")
+                    worker_id, _, session_id = str(data).partition("|")
+                    if worker_id != self.worker_id:
+                        self.l1.invalidate(session_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Session invalidation subscriber disconnected; retrying", exc_info=True)
+            finally:
+                self.l1.active = False
+                self.l1.clear()
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(1.0)
+
+    def stats(self) -> dict[str, Any]:
+        return {"l1": self.l1.stats()}
+
+    async def aclose(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.aredis.aclose()
+
     def _key(self, session_id: str) -> str:
+        if self.cluster:
+            # Hash tag: every `<key>:...` derived from this one maps to the
+            # same slot, so a turn's writes stay one MULTI/EXEC.
+            return f"{self.key_prefix}:session:{{{session_id}}}"
         return f"{self.key_prefix}:session:{session_id}"
 
-    def get_history(self, session_id: str) -> list[dict[str, str]]:
-        import json
+    def _summary_key(self, session_id: str) -> str:
+        return f"{self._key(session_id)}:summary"
 
-        key = self._key(session_id)
-        items = cast(list[str], self.redis.lrange(key, 0, -1) or [])
-        out: list[dict[str, str]] = []
+    def _redis(self, operation: str) -> ContextManager[None]:
+        return metrics.timed(metrics.REDIS_SECONDS, "redis", operation=operation)
+
+    def _decode(self, items: list[bytes]) -> list[dict[str, Any]]:
+        metrics.BYTES.inc(sum(len(raw or b"") for raw in items), stage="redis", direction="received")
+        out: list[dict[str, Any]] = []
         for raw in items:
             try:
-                msg = json.loads(raw)
+                msg = self.codec.decode(raw)
                 if isinstance(msg, dict) and "role" in msg and "content" in msg:
-                    out.append({"role": str(msg["role"]), "content": str(msg["content"])})
+                    item: dict[str, Any] = {"role": str(msg["role"]), "content": str(msg["content"])}
+                    # Entries written before ids/token counts existed get id 0
+                    # and are counted on read.
+                    item["id"] = int(msg.get("id") or 0)
+                    tokens = msg.get("tokens")
+                    item["tokens"] = int(tokens) if tokens is not None else self.token_counter(item["content"])
+                    out.append(item)
             except Exception:
                 continue
         return out
 
-    def append(self, session_id: str, role: str, content: str) -> None:
+    def _new_messages(self, messages: Iterable[tuple[str, str]]) -> list[dict[str, Any]]:
+        # Ids only need to increase within a session; offsetting by position
+        # keeps them distinct on clocks with coarse time_ns resolution.
+        base = time.time_ns()
+        out: list[dict[str, Any]] = []
+        for role, content in messages:
+            if not content:
+                continue
+            out.append(
+                {
+                    "role": role,
+                    "content": content,
+                    "id": base + len(out),
+                    "tokens": self.token_counter(content),
+                }
+            )
+        return out
+
+    def _encode(self, message: dict[str, Any]) -> bytes:
+        return self.codec.encode(message)
+
+    def _queue_turn(self, pipe: Any, session_id: str, messages: list[dict[str, Any]]) -> None:
+        key = self._key(session_id)
+        encoded = [self._encode(m) for m in messages]
+        metrics.BYTES.inc(sum(len(raw) for raw in encoded), stage="redis", direction="sent")
+        pipe.rpush(key, *encoded)
+        # The entry just before the new ones, read inside the same MULTI.
+        pipe.lindex(key, -(len(messages) + 1))
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.ttl_seconds)
+        pipe.expire(self._summary_key(session_id), self.ttl_seconds)
+        if not self.cluster:
+            pipe.publish(self.invalidation_channel, self._invalidation(session_id))
+
+    def _invalidation(self, session_id: str) -> str:
+        return f"{self.worker_id}|{session_id}"
+
+    def _publish_outside(self, session_id: str) -> None:
+        # Cluster transactions only take same-slot keyed commands, so the
+        # invalidation goes out right after the MULTI/EXEC instead.
+        if self.cluster:
+            with self._redis("publish"):
+                self.redis.publish(self.invalidation_channel, self._invalidation(session_id))
+
+    async def _apublish_outside(self, session_id: str) -> None:
+        if self.cluster:
+            with self._redis("publish"):
+                await self.aredis.publish(self.invalidation_channel, self._invalidation(session_id))
+
+    def _merged(
+        self,
+        previous: list[dict[str, Any]],
+        new: list[dict[str, Any]],
+        results: list[Any],
+    ) -> list[dict[str, Any]] | None:
+        # If the entry preceding the new ones is still the last message read
+        # at the start of the turn, nobody else wrote to the session, so the
+        # new history is known without reading the list back.
+        length, before = int(results[0]), results[1]
+        if not previous:
+            ok = length == len(new)
+        else:
+            last = self._decode([before]) if before is not None else []
+            ok = bool(last) and last[0]["id"] != 0 and last[0]["id"] == previous[-1].get("id")
+        if not ok:
+            return None
+        return (list(previous) + new)[-self.max_messages :]
+
+    def get_history(self, session_id: str) -> list[dict[str, Any]]:
+        cached = self.l1.get(session_id)
+        if cached is not None:
+            return cached
+        generation = self.l1.generation(session_id)
+        with self._redis("get_history"):
+            items = cast(list[bytes], self.redis.lrange(self._key(session_id), 0, -1) or [])
+        history = self._decode(items)
+        self.l1.put(session_id, history, generation)
+        return history
+
+    async def aget_history(self, session_id: str) -> list[dict[str, Any]]:
+        cached = self.l1.get(session_id)
+        if cached is not None:
+            return cached
+        generation = self.l1.generation(session_id)
+        with self._redis("get_history"):
+            items = cast(list[bytes], await self.aredis.lrange(self._key(session_id), 0, -1) or [])
+        history = self._decode(items)
+        self.l1.put(session_id, history, generation)
+        return history
+
+    async def astorage_stats(self, session_id: str) -> dict[str, Any]:
+        """Bytes used by a session's messages, compared with the legacy JSON encoding."""
         import json
 
-        if not content:
-            return
         key = self._key(session_id)
-        payload = json.dumps({"role": role, "content": content}, ensure_ascii=False)
-        self.redis.rpush(key, payload)
-        self.redis.ltrim(key, -self.max_messages, -1)
-        self.redis.expire(key, self.ttl_seconds)
+        with self._redis("storage_stats"):
+            items = cast(list[bytes], await self.aredis.lrange(key, 0, -1) or [])
+        stored = 0
+        legacy = 0
+        formats: dict[str, int] = {}
+        for raw in items:
+            stored += len(raw)
+            label = self.codec.describe(raw)
+            formats[label] = formats.get(label, 0) + 1
+            try:
+                msg = self.codec.decode(raw)
+            except Exception:
+                continue
+            legacy += len(json.dumps(msg, ensure_ascii=False).encode("utf-8"))
+        try:
+            redis_bytes = await self.aredis.memory_usage(key)
+        except Exception:
+            # MEMORY USAGE is not available on every server / proxy.
+            redis_bytes = None
+        return {
+            "messages": len(items),
+            "stored_bytes": stored,
+            "legacy_json_bytes": legacy,
+            "saved_bytes": legacy - stored,
+            "saved_pct": round(100.0 * (legacy - stored) / legacy, 2) if legacy else 0.0,
+            "redis_memory_bytes": int(redis_bytes) if redis_bytes is not None else None,
+            "formats": formats,
+        }
+
+    async def aget_summary(self, session_id: str) -> dict[str, Any] | None:
+        import json
+
+        with self._redis("get_summary"):
+            raw = await self.aredis.get(self._summary_key(session_id))
+        if not raw:
+            return None
+        try:
+            data = json.loads(raw)
+        except Exception:
+            return None
+        return data if isinstance(data, dict) and data.get("text") else None
+
+    async def aset_summary(self, session_id: str, text: str, through_id: int, tokens: int) -> None:
+        import json
+
+        value = json.dumps({"text": text, "through_id": through_id, "tokens": tokens}, ensure_ascii=False)
+        with self._redis("set_summary"):
+            await self.aredis.set(self._summary_key(session_id), value, ex=self.ttl_seconds)
+
+    def append_turn(
+        self,
+        session_id: str,
+        messages: Iterable[tuple[str, str]],
+        previous: Optional[list[dict[str, Any]]] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Append messages, trim, refresh the TTL and return the new history in
+        one MULTI/EXEC round trip. Pass the history read at the start of the
+        turn as `previous` to skip reading and re-parsing the list.
+        """
+        new = self._new_messages(messages)
+        if not new:
+            return list(previous) if previous is not None else self.get_history(session_id)
+        self.l1.invalidate(session_id)
+        generation = self.l1.generation(session_id)
+        pipe = self.redis.pipeline(transaction=True)
+        self._queue_turn(pipe, session_id, new)
+        if previous is None:
+            pipe.lrange(self._key(session_id), 0, -1)
+        with self._redis("append_turn"):
+            results = pipe.execute()
+        self._publish_outside(session_id)
+        if previous is None:
+            history = self._decode(cast(list[bytes], results[-1] or []))
+        else:
+            merged = self._merged(previous, new, results)
+            if merged is None:
+                return self.get_history(session_id)
+            history = merged
+        self.l1.put(session_id, history, generation)
+        return history
+
+    async def aappend_turn(
+        self,
+        session_id: str,
+        messages: Iterable[tuple[str, str]],
+        previous: Optional[list[dict[str, Any]]] = None,
+    ) -> list[dict[str, Any]]:
+        new = self._new_messages(messages)
+        if not new:
+            return list(previous) if previous is not None else await self.aget_history(session_id)
+        self.l1.invalidate(session_id)
+        generation = self.l1.generation(session_id)
+        pipe = self.aredis.pipeline(transaction=True)
+        self._queue_turn(pipe, session_id, new)
+        if previous is None:
+            pipe.lrange(self._key(session_id), 0, -1)
+        with self._redis("append_turn"):
+            results = await pipe.execute()
+        await self._apublish_outside(session_id)
+        if previous is None:
+            history = self._decode(cast(list[bytes], results[-1] or []))
+        else:
+            merged = self._merged(previous, new, results)
+            if merged is None:
+                return await self.aget_history(session_id)
+            history = merged
+        self.l1.put(session_id, history, generation)
+        return history
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        new = self._new_messages([(role, content)])
+        if not new:
+            return
+        self.l1.invalidate(session_id)
+        pipe = self.redis.pipeline(transaction=True)
+        self._queue_turn(pipe, session_id, new)
+        with self._redis("append"):
+            pipe.execute()
+        self._publish_outside(session_id)
+
+    async def aappend(self, session_id: str, role: str, content: str) -> None:
+        new = self._new_messages([(role, content)])
+        if not new:
+            return
+        self.l1.invalidate(session_id)
+        pipe = self.aredis.pipeline(transaction=True)
+        self._queue_turn(pipe, session_id, new)
+        with self._redis("append"):
+            await pipe.execute()
+        await self._apublish_outside(session_id)
 
     def reset(self, session_id: str) -> None:
-        self.redis.delete(self._key(session_id))
+        self.l1.invalidate(session_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(self._key(session_id), self._summary_key(session_id))
+        if not self.cluster:
+            pipe.publish(self.invalidation_channel, self._invalidation(session_id))
+        with self._redis("reset"):
+            pipe.execute()
+        self._publish_outside(session_id)
+
+    async def areset(self, session_id: str) -> None:
+        self.l1.invalidate(session_id)
+        pipe = self.aredis.pipeline(transaction=True)
+        pipe.delete(self._key(session_id), self._summary_key(session_id))
+        if not self.cluster:
+            pipe.publish(self.invalidation_channel, self._invalidation(session_id))
+        with self._redis("reset"):
+            await pipe.execute()
+        await self._apublish_outside(session_id)
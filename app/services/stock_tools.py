@@ -1,11 +1,21 @@
-from typing import cast
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
 
-from langchain_core.tools import BaseTool, tool
+from langchain_core.tools import BaseTool, StructuredTool
 
+from app.core import metrics
 from app.core.errors import UpstreamError
 from app.services.eodhd_client import EODHDError
 from app.services.stocks_service import StocksService
 
+logger = logging.getLogger(__name__)
+
 
 def _normalize_symbol(symbol: str, default_exchange: str) -> str:
     sym = (symbol or "").strip().upper()
@@ -16,25 +26,251 @@ def _normalize_symbol(symbol: str, default_exchange: str) -> str:
     return sym
 
 
-def build_stock_tools(stocks: StocksService, default_exchange: str = "US") -> list[BaseTool]:
-    @tool("get_stock_context")
+# get_universe_top's default limit, which is what the model almost always asks for.
+UNIVERSE_TOP_DEFAULT = 20
+
+_MEMO_RESULTS = {"turn_hits": "turn_hit", "shared_hits": "shared_hit", "misses": "miss"}
+
+_turn_results: ContextVar[dict[tuple, str] | None] = ContextVar("stock_tool_turn_results", default=None)
+
+
+@contextmanager
+def tool_memo_scope() -> Iterator[None]:
+    """Share tool results between all tool calls made inside this block (one chat turn)."""
+    token = _turn_results.set({})
+    try:
+        yield
+    finally:
+        _turn_results.reset(token)
+
+
+class ToolMemo:
+    """
+    Two-level memo for tool results.
+
+    The turn layer (see `tool_memo_scope`) returns repeated calls within one
+    agent run without touching Mongo. The shared layer keeps results for
+    `ttl_seconds` across requests, keyed on the normalized arguments plus a
+    cheap version lookup (the symbol's latest stored date), so a sync that
+    writes newer bars is picked up immediately.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 512, log_every: int = 200):
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self.log_every = int(log_every)
+        self._entries: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"turn_hits": 0, "shared_hits": 0, "misses": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+            counts = dict(self._counts)
+        metrics.CACHE_REQUESTS.inc(cache="tool_memo", result=_MEMO_RESULTS[name])
+        lookups = sum(counts.values())
+        if self.log_every and lookups % self.log_every == 0:
+            hits = counts["turn_hits"] + counts["shared_hits"]
+            logger.info(
+                "Tool memo: %d lookups, hit rate %.1f%% (turn %d, shared %d)",
+                lookups,
+                100.0 * hits / lookups,
+                counts["turn_hits"],
+                counts["shared_hits"],
+            )
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            out: dict[str, Any] = dict(self._counts)
+            out["entries"] = len(self._entries)
+        lookups = out["turn_hits"] + out["shared_hits"] + out["misses"]
+        out["hit_rate"] = round((out["turn_hits"] + out["shared_hits"]) / lookups, 4) if lookups else 0.0
+        return out
+
+    def call(self, key: tuple, version: Callable[[], str] | None, compute: Callable[[], str]) -> str:
+        turn = _turn_results.get()
+        if turn is not None and key in turn:
+            self._count("turn_hits")
+            logger.debug("Tool memo turn hit: %s", key)
+            return turn[key]
+
+        shared_key: tuple | None = None
+        if self.ttl_seconds > 0 and version is not None:
+            shared_key = key + (version(),)
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(shared_key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(shared_key)
+                    value: str | None = entry[1]
+                else:
+                    value = None
+            if value is not None:
+                self._count("shared_hits")
+                logger.debug("Tool memo shared hit: %s", key)
+                if turn is not None:
+                    turn[key] = value
+                return value
+
+        self._count("misses")
+        value = compute()
+        if turn is not None:
+            turn[key] = value
+        if shared_key is not None:
+            self._store(shared_key, value, self.ttl_seconds)
+        return value
+
+    def _store(self, shared_key: tuple, value: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[shared_key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(shared_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def prime(
+        self,
+        key: tuple,
+        version: Callable[[], str],
+        compute: Callable[[], str],
+        ttl_seconds: float | None = None,
+    ) -> bool:
+        """Compute `key` and store it in the shared layer without counting a lookup."""
+        if self.ttl_seconds <= 0:
+            return False
+        shared_key = key + (version(),)
+        self._store(shared_key, compute(), self.ttl_seconds if ttl_seconds is None else float(ttl_seconds))
+        return True
+
+
+def _symbol_version(stocks: StocksService, sym: str) -> Callable[[], str]:
+    return lambda: stocks.latest_date(sym) or ""
+
+
+# Memo entries as (key, version, compute). The tools and warm_tool_memo share
+# these so warmed entries land on the keys the tools look up.
+def _context_entry(stocks: StocksService, sym: str) -> tuple[tuple, Callable[[], str], Callable[[], str]]:
+    return ("context", sym), _symbol_version(stocks, sym), lambda: stocks.build_context(sym)
+
+
+def _universe_entry(stocks: StocksService, limit: int) -> tuple[tuple, Callable[[], str], Callable[[], str]]:
+    return ("universe_top", limit), stocks.data_version, lambda: stocks.build_universe_top_context(limit=limit)
+
+
+def warm_tool_memo(
+    memo: ToolMemo,
+    stocks: StocksService,
+    symbols: list[str],
+    universe_limit: int = UNIVERSE_TOP_DEFAULT,
+    ttl_seconds: float | None = None,
+) -> int:
+    """
+    Fill the shared memo layer with the universe ranking and the context
+    blocks of `symbols`, so the first chats after a refresh are served from
+    memory. Returns the number of entries stored.
+    """
+    entries = [_universe_entry(stocks, universe_limit)]
+    entries += [_context_entry(stocks, sym) for sym in dict.fromkeys(symbols) if sym]
+    warmed = 0
+    for key, version, compute in entries:
+        try:
+            warmed += memo.prime(key, version, compute, ttl_seconds=ttl_seconds)
+        except Exception:
+            logger.exception("Tool memo warm-up failed for %s", key)
+    return warmed
+
+
+async def _in_thread(
+    func: Callable[..., str],
+    *args: Any,
+    timeout_seconds: float,
+    on_timeout: str,
+) -> str:
+    if timeout_seconds <= 0:
+        return await asyncio.to_thread(func, *args)
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout=timeout_seconds)
+    except asyncio.TimeoutError:
+        # The worker thread finishes in the background (a late news fetch is
+        # still cached); the agent moves on with a placeholder result.
+        logger.warning("Tool %s timed out after %.1fs", func.__name__, timeout_seconds)
+        metrics.ERRORS.inc(stage="tool", error="TimeoutError")
+        return on_timeout
+
+
+def build_stock_tools(
+    stocks: StocksService,
+    default_exchange: str = "US",
+    timeout_seconds: float = 0.0,
+    memo: ToolMemo | None = None,
+) -> list[BaseTool]:
+    # Each tool has a sync body plus a coroutine for the async agent path.
+    # StocksService uses blocking pymongo/requests, so the coroutines hand the
+    # work to a thread and the event loop stays free while Mongo/EODHD answer.
+    # Tool calls from one agent step are gathered, each with its own deadline.
+    memo = memo or ToolMemo(ttl_seconds=0)
+
     def get_stock_context(symbol: str) -> str:
         """Get EOD stock data from MongoDB by symbol like AAPL.US."""
         sym = _normalize_symbol(symbol, default_exchange)
         if not sym:
             return "No symbol provided."
-        return stocks.build_context(sym)
+        return memo.call(*_context_entry(stocks, sym))
+
+    async def aget_stock_context(symbol: str) -> str:
+        return await _in_thread(
+            get_stock_context,
+            symbol,
+            timeout_seconds=timeout_seconds,
+            on_timeout=f"[STOCK_DATA] Timed out loading data for {symbol}.",
+        )
 
-    @tool("get_universe_top")
-    def get_universe_top(limit: int = 20) -> str:
+    def get_universe_top(limit: int = UNIVERSE_TOP_DEFAULT) -> str:
         """Get top stocks by market cap from MongoDB."""
         if limit < 1:
             limit = 1
         if limit > 200:
             limit = 200
-        return stocks.build_universe_top_context(limit=limit)
+        return memo.call(*_universe_entry(stocks, limit))
+
+    async def aget_universe_top(limit: int = UNIVERSE_TOP_DEFAULT) -> str:
+        return await _in_thread(
+            get_universe_top,
+            limit,
+            timeout_seconds=timeout_seconds,
+            on_timeout="[UNIVERSE_TOP] Timed out loading the universe ranking.",
+        )
+
+    def news_block(sym: str, limit: int, from_date: str | None, to_date: str | None) -> str:
+        items = stocks.get_news_cached(
+            symbol=sym,
+            limit=limit,
+            from_date=from_date,
+            to_date=to_date,
+            cache_hours=24,
+            retention_days=30,
+            default_exchange=default_exchange,
+        )
+        if not items:
+            return f"[STOCK_NEWS] No news found for {sym}."
+
+        lines: list[str] = []
+        lines.append("[STOCK_NEWS]")
+        lines.append(f"symbol: {sym}")
+        rank = 0
+        for item in items:
+            rank += 1
+            date = item.get("date") or item.get("datetime") or item.get("published") or ""
+            title = item.get("title") or ""
+            source = item.get("source") or item.get("source_name") or ""
+            url = item.get("link") or item.get("url") or ""
+            line = f"{rank}. {date} | {title}"
+            if source:
+                line = line + f" | source: {source}"
+            if url:
+                line = line + f" | url: {url}"
+            lines.append(line.strip())
+        return "\n".join(lines) + "\n"
 
-    @tool("get_stock_news")
     def get_stock_news(
         symbol: str,
         limit: int = 5,
@@ -49,39 +285,48 @@ def build_stock_tools(stocks: StocksService, default_exchange: str = "US") -> li
             limit = 1
         if limit > 20:
             limit = 20
+        # Failures raise out of news_block, so error messages are never memoized.
         try:
-            items = stocks.get_news_cached(
-                symbol=sym,
-                limit=limit,
-                from_date=from_date,
-                to_date=to_date,
-                cache_hours=24,
-                retention_days=30,
-                default_exchange=default_exchange,
+            return memo.call(
+                ("news", sym, limit, from_date, to_date),
+                _symbol_version(stocks, sym),
+                lambda: news_block(sym, limit, from_date, to_date),
             )
         except (EODHDError, UpstreamError) as e:
             return f"[STOCK_NEWS] News unavailable for {sym}. Error: {e}"
         except Exception:
             return f"[STOCK_NEWS] News unavailable for {sym}."
-        if not items:
-            return f"[STOCK_NEWS] No news found for {sym}."
 
-        lines: list[str] = []
-        lines.append("[STOCK_NEWS]")
-        lines.append(f"symbol: {sym}")
-        rank = 0
-        for item in items:
-            rank += 1
-            date = item.get("date") or item.get("datetime") or item.get("published") or ""
-            title = item.get("title") or ""
-            source = item.get("source") or item.get("source_name") or ""
-            url = item.get("link") or item.get("url") or ""
-            line = f"{rank}. {date} | {title}"
-            if source:
-                line = line + f" | source: {source}"
-            if url:
-                line = line + f" | url: {url}"
-            lines.append(line.strip())
-        return "\n".join(lines) + "\n"
+    async def aget_stock_news(
+        symbol: str,
+        limit: int = 5,
+        from_date: str | None = None,
+        to_date: str | None = None,
+    ) -> str:
+        return await _in_thread(
+            get_stock_news,
+            symbol,
+            limit,
+            from_date,
+            to_date,
+            timeout_seconds=timeout_seconds,
+            on_timeout=f"[STOCK_NEWS] News unavailable for {symbol} (timed out).",
+        )
 
-    return cast(list[BaseTool], [get_stock_context, get_universe_top, get_stock_news])
+    return [
+        StructuredTool.from_function(
+            func=get_stock_context,
+            coroutine=aget_stock_context,
+            name="get_stock_context",
+        ),
+        StructuredTool.from_function(
+            func=get_universe_top,
+            coroutine=aget_universe_top,
+            name="get_universe_top",
+        ),
+        StructuredTool.from_function(
+            func=get_stock_news,
+            coroutine=aget_stock_news,
+            name="get_stock_news",
+        ),
+    ]
@@ -1,15 +1,22 @@
 from __future__ import annotations
 
 import datetime as dt
-from dataclasses import dataclass
-from typing import Any, Iterable
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
 
 from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
 
 from app.core.errors import UpstreamError
 from app.core.mongo import MongoStore
 from app.services.eodhd_client import EODHDClient, EODHDError
 
+logger = logging.getLogger(__name__)
+
 
 def _to_float(v: Any) -> float | None:
     try:
@@ -33,23 +40,137 @@ def _iso_today() -> str:
     return dt.date.today().isoformat()
 
 
+_PRICE_FIELDS = ("open", "high", "low", "close", "adjusted_close", "volume")
+
+
+def _content_hash(doc: dict[str, Any]) -> str:
+    raw = "|".join(repr(doc.get(name)) for name in _PRICE_FIELDS)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _price_doc(symbol: str, r: dict[str, Any]) -> dict[str, Any] | None:
+    date = str(r.get("date") or "").strip()
+    if not date:
+        return None
+    doc = {
+        "symbol": symbol,
+        "date": date,
+        "open": _to_float(r.get("open")),
+        "high": _to_float(r.get("high")),
+        "low": _to_float(r.get("low")),
+        "close": _to_float(r.get("close")),
+        "adjusted_close": _to_float(r.get("adjusted_close") or r.get("adjustedClose")),
+        "volume": _to_int(r.get("volume")),
+        "source": "eodhd",
+    }
+    doc["content_hash"] = _content_hash(doc)
+    return doc
+
+
+@dataclass(frozen=True)
+class PriceWriteResult:
+    inserted: int = 0
+    changed: int = 0
+    unchanged: int = 0
+
+    @property
+    def written(self) -> int:
+        return self.inserted + self.changed
+
+    def __add__(self, other: "PriceWriteResult") -> "PriceWriteResult":
+        return PriceWriteResult(
+            inserted=self.inserted + other.inserted,
+            changed=self.changed + other.changed,
+            unchanged=self.unchanged + other.unchanged,
+        )
+
+
+# Keywords whose answers are not in the stored EOD data (news is fetched on
+# demand by the get_stock_news tool).
+_TOOL_ONLY_HINTS = ("news", "headline", "tin tức")
+
+# A [STOCK_DATA] block holds the latest bar, the day change and 5/20/60-day
+# returns. It only covers the question when the question asks for those.
+_LATEST_BAR_HINTS = re.compile(
+    r"\b(price|prices|quote|close|closed|closing|open|high|low|volume|latest|today|"
+    r"day change|daily change|trading at|giá|khối lượng|hôm nay)\b"
+)
+_BEYOND_BAR_HINTS = re.compile(
+    r"\b(history|historical|since|year|years|month|months|chart|compare|comparison|versus|vs|"
+    r"fundamental|fundamentals|earnings|revenue|dividend|dividends|valuation|p/e|pe ratio|"
+    r"forecast|predict|lịch sử|so sánh)\b"
+)
+
+
+@dataclass(frozen=True)
+class PrefetchedContext:
+    text: str
+    kind: str = ""
+    symbols: list[str] = field(default_factory=list)
+    # True when the context alone answers the question, so tool calls can be skipped.
+    complete: bool = False
+
+
+@dataclass(frozen=True)
+class SymbolSyncResult:
+    symbol: str
+    ok: bool
+    rows: int = 0
+    inserted_prices: int = 0
+    changed_prices: int = 0
+    unchanged_prices: int = 0
+    error: str | None = None
+
+    @property
+    def upserted_prices(self) -> int:
+        return self.inserted_prices + self.changed_prices
+
+
 @dataclass(frozen=True)
 class SyncResult:
     symbols: list[str]
     upserted_prices: int
     upserted_universe: int
+    results: list[SymbolSyncResult] = field(default_factory=list)
+
+    @property
+    def inserted_prices(self) -> int:
+        return sum(r.inserted_prices for r in self.results)
+
+    @property
+    def changed_prices(self) -> int:
+        return sum(r.changed_prices for r in self.results)
+
+    @property
+    def unchanged_prices(self) -> int:
+        return sum(r.unchanged_prices for r in self.results)
 
 
 @dataclass(frozen=True)
 class SyncSymbolsResult:
     symbols: list[str]
     upserted_prices: int
+    results: list[SymbolSyncResult] = field(default_factory=list)
+
+    @property
+    def inserted_prices(self) -> int:
+        return sum(r.inserted_prices for r in self.results)
+
+    @property
+    def changed_prices(self) -> int:
+        return sum(r.changed_prices for r in self.results)
+
+    @property
+    def unchanged_prices(self) -> int:
+        return sum(r.unchanged_prices for r in self.results)
 
 
 @dataclass(frozen=True)
 class StocksService:
     mongo: MongoStore
     eodhd: EODHDClient
+    sync_workers: int = 4
+    bulk_chunk_size: int = 1000
 
     @property
     def prices(self):
@@ -63,6 +184,16 @@ class StocksService:
     def news(self):
         return self.mongo.db["news"]
 
+    @property
+    def meta(self):
+        return self.mongo.db["meta"]
+
+    def data_version(self) -> str:
+        # Bumped by write_prices whenever rows change; used to key caches
+        # derived from prices_daily.
+        doc = self.meta.find_one({"_id": "prices_daily"}) or {}
+        return f"{doc.get('latest_date') or '-'}:{int(doc.get('version') or 0)}"
+
     def _symbol_from_item(self, item: dict[str, Any], default_exchange: str = "US") -> str:
         code = str(item.get("code") or item.get("Code") or "").strip()
         exch = str(item.get("exchange") or item.get("Exchange") or default_exchange).strip()
@@ -177,6 +308,201 @@ class StocksService:
             offset=0,
         )
 
+    def write_prices(self, docs: Iterable[dict[str, Any]]) -> PriceWriteResult:
+        # Shared prices_daily write path. Stored content hashes are read back
+        # for the batch first, and only new or changed rows are sent, so
+        # re-synced identical bars cost no document rewrite (and no oplog).
+        batch: dict[tuple[str, str], dict[str, Any]] = {}
+        for doc in docs:
+            batch[(doc["symbol"], doc["date"])] = doc
+        if not batch:
+            return PriceWriteResult()
+
+        symbols = sorted({symbol for symbol, _ in batch})
+        dates = [date for _, date in batch]
+        existing: dict[tuple[str, str], str | None] = {}
+        cur = self.prices.find(
+            {"symbol": {"$in": symbols}, "date": {"$gte": min(dates), "$lte": max(dates)}},
+            projection={"_id": 0, "symbol": 1, "date": 1, "content_hash": 1},
+        )
+        for row in cur:
+            key = (row.get("symbol"), row.get("date"))
+            if key in batch:
+                existing[key] = row.get("content_hash")
+
+        now = dt.datetime.utcnow().isoformat()
+        ops: list[UpdateOne] = []
+        latest = ""
+        changed = 0
+        unchanged = 0
+        for key, doc in batch.items():
+            if key in existing:
+                if existing[key] == doc["content_hash"]:
+                    unchanged += 1
+                    continue
+                changed += 1
+            doc = dict(doc)
+            doc["updated_at"] = now
+            latest = max(latest, key[1])
+            ops.append(UpdateOne({"symbol": key[0], "date": key[1]}, {"$set": doc}, upsert=True))
+
+        if not ops:
+            return PriceWriteResult(unchanged=unchanged)
+        res = self.prices.bulk_write(ops, ordered=False)
+        inserted = int(getattr(res, "upserted_count", 0) or 0)
+        self.meta.update_one(
+            {"_id": "prices_daily"},
+            {
+                "$inc": {"version": 1},
+                "$max": {"latest_date": latest},
+                "$set": {"updated_at": now},
+            },
+            upsert=True,
+        )
+        return PriceWriteResult(inserted=inserted, changed=len(ops) - inserted, unchanged=unchanged)
+
+    def sync_eod_range(
+        self,
+        symbol: str,
+        from_date: str | None,
+        to_date: str | None,
+        period: str,
+    ) -> SymbolSyncResult:
+        try:
+            records = self.eodhd.eod(
+                symbol=symbol,
+                from_date=from_date,
+                to_date=to_date,
+                period=period,
+                order="a",
+            )
+        except EODHDError as e:
+            return SymbolSyncResult(symbol=symbol, ok=False, error=f"EODHD: {e}")
+        if not records:
+            return SymbolSyncResult(symbol=symbol, ok=True)
+        try:
+            docs = [doc for doc in (_price_doc(symbol, r) for r in records) if doc is not None]
+            written = self.write_prices(docs)
+        except PyMongoError as e:
+            return SymbolSyncResult(symbol=symbol, ok=False, rows=len(records), error=f"MongoDB: {e}")
+        return SymbolSyncResult(
+            symbol=symbol,
+            ok=True,
+            rows=len(records),
+            inserted_prices=written.inserted,
+            changed_prices=written.changed,
+            unchanged_prices=written.unchanged,
+        )
+
+    def latest_dates(self, symbols: Iterable[str]) -> dict[str, str]:
+        # One aggregation for all symbols. The $sort matches the
+        # (symbol ASC, date DESC) index, so $group/$first becomes an index
+        # scan that reads one entry per symbol instead of whole histories.
+        wanted = list(dict.fromkeys(s for s in symbols if s))
+        if not wanted:
+            return {}
+        pipeline = [
+            {"$match": {"symbol": {"$in": wanted}}},
+            {"$sort": {"symbol": 1, "date": -1}},
+            {"$group": {"_id": "$symbol", "date": {"$first": "$date"}}},
+        ]
+        out: dict[str, str] = {}
+        for doc in self.prices.aggregate(pipeline, hint=[("symbol", 1), ("date", -1)]):
+            if doc.get("_id") and doc.get("date"):
+                out[str(doc["_id"])] = str(doc["date"])
+        return out
+
+    def latest_date(self, symbol: str) -> str | None:
+        # Single-symbol version of latest_dates. The filter, sort and
+        # projection are all on the (symbol ASC, date DESC) index, so this is a
+        # covered point read with no document fetch.
+        doc = self.prices.find_one(
+            {"symbol": symbol},
+            projection={"_id": 0, "date": 1},
+            sort=[("date", -1)],
+            hint=[("symbol", 1), ("date", -1)],
+        )
+        return str(doc["date"]) if doc and doc.get("date") else None
+
+    def first_dates(self, symbols: Iterable[str]) -> dict[str, str]:
+        # Same shape as latest_dates, on the (symbol ASC, date ASC) index.
+        wanted = list(dict.fromkeys(s for s in symbols if s))
+        if not wanted:
+            return {}
+        pipeline = [
+            {"$match": {"symbol": {"$in": wanted}}},
+            {"$sort": {"symbol": 1, "date": 1}},
+            {"$group": {"_id": "$symbol", "date": {"$first": "$date"}}},
+        ]
+        out: dict[str, str] = {}
+        for doc in self.prices.aggregate(pipeline, hint=[("symbol", 1), ("date", 1)]):
+            if doc.get("_id") and doc.get("date"):
+                out[str(doc["_id"])] = str(doc["date"])
+        return out
+
+    def _incremental_from_dates(self, symbols: list[str], to_date: str | None) -> dict[str, str | None]:
+        # Missing symbols get None (full history); symbols already stored up
+        # to `to_date`/today are left out entirely.
+        end = to_date or _iso_today()
+        latest = self.latest_dates(symbols)
+        out: dict[str, str | None] = {}
+        for symbol in symbols:
+            last = latest.get(symbol)
+            if not last:
+                out[symbol] = None
+                continue
+            try:
+                start = (dt.date.fromisoformat(last[:10]) + dt.timedelta(days=1)).isoformat()
+            except ValueError:
+                out[symbol] = None
+                continue
+            if start <= end:
+                out[symbol] = start
+        return out
+
+    def sync_eod_many(
+        self,
+        symbols: list[str],
+        from_date: str | None = None,
+        to_date: str | None = None,
+        period: str = "d",
+        on_result: Callable[[SymbolSyncResult], None] | None = None,
+        incremental: bool = False,
+        on_total: Callable[[int], None] | None = None,
+    ) -> list[SymbolSyncResult]:
+        # Each worker fetches one symbol and writes it, so upstream fetches of
+        # some symbols overlap with Mongo writes of others. Failures are
+        # recorded per symbol instead of aborting the whole run.
+        if on_total is not None:
+            on_total(len(symbols))
+        if not symbols:
+            return []
+        by_symbol: dict[str, SymbolSyncResult] = {}
+        starts: dict[str, str | None] = {symbol: from_date for symbol in symbols}
+        if incremental and from_date is None:
+            starts = self._incremental_from_dates(symbols, to_date)
+            for symbol in symbols:
+                if symbol not in starts:
+                    res = SymbolSyncResult(symbol=symbol, ok=True)
+                    by_symbol[symbol] = res
+                    if on_result is not None:
+                        on_result(res)
+        pending = [symbol for symbol in dict.fromkeys(symbols) if symbol in starts]
+        workers = max(1, min(int(self.sync_workers), len(pending) or 1))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eod-sync") as pool:
+            futures = {
+                pool.submit(self.sync_eod_range, symbol, starts[symbol], to_date, period): symbol
+                for symbol in pending
+            }
+            for fut in as_completed(futures):
+                res = fut.result()
+                by_symbol[res.symbol] = res
+                if not res.ok:
+                    logger.warning("EOD sync failed for %s: %s", res.symbol, res.error)
+                if on_result is not None:
+                    on_result(res)
+        return [by_symbol[symbol] for symbol in symbols]
+
     def sync_top_eod(
         self,
         exchange: str = "us",
@@ -185,6 +511,9 @@ class StocksService:
         from_date: str | None = None,
         to_date: str | None = None,
         period: str = "d",
+        on_result: Callable[[SymbolSyncResult], None] | None = None,
+        incremental: bool = False,
+        on_total: Callable[[int], None] | None = None,
     ) -> SyncResult:
         try:
             items = self.get_top_symbols(exchange=exchange, limit=limit, min_market_cap=min_market_cap)
@@ -199,7 +528,9 @@ class StocksService:
                 symbols.append(symbol)
                 doc = dict(item)
                 doc["symbol"] = symbol
-                doc["exchange"] = str(item.get("exchange") or item.get("Exchange") or exchange).lower()
+                # Kept equal to the symbol suffix so top_universe_symbols can
+                # filter on it.
+                doc["exchange"] = symbol.rsplit(".", 1)[1].lower()
                 res = self.universe.update_one(
                     {"exchange": doc["exchange"], "code": doc.get("code") or doc.get("Code")},
                     {"$set": doc},
@@ -208,90 +539,66 @@ class StocksService:
                 if getattr(res, "upserted_id", None) is not None:
                     upserted_universe += 1
 
-            upserted_prices = 0
-            for symbol in symbols:
-                records = self.eodhd.eod(
-                    symbol=symbol,
-                    from_date=from_date,
-                    to_date=to_date,
-                    period=period,
-                    order="a",
-                )
-                if not records:
-                    continue
-
-                ops: list[UpdateOne] = []
-                for r in records:
-                    date = str(r.get("date") or "").strip()
-                    if not date:
-                        continue
-                    doc = {
-                        "symbol": symbol,
-                        "date": date,
-                        "open": _to_float(r.get("open")),
-                        "high": _to_float(r.get("high")),
-                        "low": _to_float(r.get("low")),
-                        "close": _to_float(r.get("close")),
-                        "adjusted_close": _to_float(r.get("adjusted_close") or r.get("adjustedClose")),
-                        "volume": _to_int(r.get("volume")),
-                        "source": "eodhd",
-                        "updated_at": dt.datetime.utcnow().isoformat(),
-                    }
-                    ops.append(UpdateOne({"symbol": symbol, "date": date}, {"$set": doc}, upsert=True))
-
-                if ops:
-                    res = self.prices.bulk_write(ops, ordered=False)
-                    upserted_prices += int(getattr(res, "upserted_count", 0) or 0)
-                    upserted_prices += int(getattr(res, "modified_count", 0) or 0)
-
+            results = self.sync_eod_many(
+                symbols,
+                from_date=from_date,
+                to_date=to_date,
+                period=period,
+                on_result=on_result,
+                incremental=incremental,
+                on_total=on_total,
+            )
             return SyncResult(
                 symbols=symbols,
-                upserted_prices=upserted_prices,
+                upserted_prices=sum(r.upserted_prices for r in results),
                 upserted_universe=upserted_universe,
+                results=results,
             )
         except EODHDError as e:
             raise UpstreamError(f"EODHD sync failed: {e}")
 
-    def sync_bulk_last_day(self, exchange_code: str = "US", symbols: Iterable[str] | None = None) -> int:
+    def sync_bulk_last_day(
+        self,
+        exchange_code: str = "US",
+        symbols: Iterable[str] | None = None,
+        on_chunk: Callable[[PriceWriteResult], None] | None = None,
+    ) -> PriceWriteResult:
+        # Rows are streamed from EODHD, filtered against `wanted` as they
+        # arrive and written in fixed-size chunks, so memory stays flat
+        # regardless of how large the exchange is.
         try:
             wanted: set[str] = set()
             if symbols:
                 for sym in symbols:
                     if sym:
                         wanted.add(sym.upper())
-            records = self.eodhd.eod_bulk_last_day(exchange_code=exchange_code)
-            if not records:
-                return 0
 
-            ops: list[UpdateOne] = []
-            for r in records:
+            result = PriceWriteResult()
+            docs: list[dict[str, Any]] = []
+            for r in self.eodhd.iter_eod_bulk_last_day(exchange_code=exchange_code):
                 code = str(r.get("code") or r.get("Code") or r.get("symbol") or "").strip()
-                date = str(r.get("date") or "").strip()
-                if not code or not date:
+                if not code:
                     continue
                 symbol = code if "." in code else f"{code}.{exchange_code.upper()}"
                 if wanted and symbol.upper() not in wanted:
                     continue
-                doc = {
-                    "symbol": symbol,
-                    "date": date,
-                    "open": _to_float(r.get("open")),
-                    "high": _to_float(r.get("high")),
-                    "low": _to_float(r.get("low")),
-                    "close": _to_float(r.get("close")),
-                    "adjusted_close": _to_float(r.get("adjusted_close") or r.get("adjustedClose")),
-                    "volume": _to_int(r.get("volume")),
-                    "source": "eodhd",
-                    "updated_at": dt.datetime.utcnow().isoformat(),
-                }
-                ops.append(UpdateOne({"symbol": symbol, "date": date}, {"$set": doc}, upsert=True))
-
-            if not ops:
-                return 0
-            res = self.prices.bulk_write(ops, ordered=False)
-            return int(getattr(res, "upserted_count", 0) or 0) + int(
-                getattr(res, "modified_count", 0) or 0
-            )
+                doc = _price_doc(symbol, r)
+                if doc is None:
+                    continue
+                docs.append(doc)
+                if len(docs) >= self.bulk_chunk_size:
+                    written = self.write_prices(docs)
+                    result = result + written
+                    docs = []
+                    if on_chunk is not None:
+                        on_chunk(written)
+
+            if docs:
+                written = self.write_prices(docs)
+                result = result + written
+                if on_chunk is not None:
+                    on_chunk(written)
+            return result
         except EODHDError as e:
             raise UpstreamError(f"EODHD bulk sync failed: {e}")
 
@@ -302,6 +609,9 @@ class StocksService:
         from_date: str | None = None,
         to_date: str | None = None,
         period: str = "d",
+        on_result: Callable[[SymbolSyncResult], None] | None = None,
+        incremental: bool = False,
+        on_total: Callable[[int], None] | None = None,
     ) -> SyncSymbolsResult:
         try:
             final_symbols: list[str] = []
@@ -315,46 +625,41 @@ class StocksService:
                 seen.add(norm)
                 final_symbols.append(norm)
 
-            upserted_prices = 0
-            for symbol in final_symbols:
-                records = self.eodhd.eod(
-                    symbol=symbol,
-                    from_date=from_date,
-                    to_date=to_date,
-                    period=period,
-                    order="a",
-                )
-                if not records:
-                    continue
-
-                ops: list[UpdateOne] = []
-                for r in records:
-                    date = str(r.get("date") or "").strip()
-                    if not date:
-                        continue
-                    doc = {
-                        "symbol": symbol,
-                        "date": date,
-                        "open": _to_float(r.get("open")),
-                        "high": _to_float(r.get("high")),
-                        "low": _to_float(r.get("low")),
-                        "close": _to_float(r.get("close")),
-                        "adjusted_close": _to_float(r.get("adjusted_close") or r.get("adjustedClose")),
-                        "volume": _to_int(r.get("volume")),
-                        "source": "eodhd",
-                        "updated_at": dt.datetime.utcnow().isoformat(),
-                    }
-                    ops.append(UpdateOne({"symbol": symbol, "date": date}, {"$set": doc}, upsert=True))
-
-                if ops:
-                    res = self.prices.bulk_write(ops, ordered=False)
-                    upserted_prices += int(getattr(res, "upserted_count", 0) or 0)
-                    upserted_prices += int(getattr(res, "modified_count", 0) or 0)
-
-            return SyncSymbolsResult(symbols=final_symbols, upserted_prices=upserted_prices)
+            results = self.sync_eod_many(
+                final_symbols,
+                from_date=from_date,
+                to_date=to_date,
+                period=period,
+                on_result=on_result,
+                incremental=incremental,
+                on_total=on_total,
+            )
+            return SyncSymbolsResult(
+                symbols=final_symbols,
+                upserted_prices=sum(r.upserted_prices for r in results),
+                results=results,
+            )
         except EODHDError as e:
             raise UpstreamError(f"EODHD sync failed: {e}")
 
+    def top_universe_symbols(self, limit: int = 20, exchange: str | None = None) -> list[str]:
+        # Universe rows store the lower-cased symbol suffix (the EODHD
+        # exchange code) in `exchange`; see sync_top_eod.
+        query: dict[str, Any] = {}
+        if exchange:
+            query["exchange"] = exchange.lower()
+        cur = (
+            self.universe.find(query, projection={"_id": 0, "symbol": 1})
+            .sort([("market_capitalization", -1), ("MarketCapitalization", -1)])
+            .limit(int(limit))
+        )
+        symbols: list[str] = []
+        for doc in cur:
+            sym = doc.get("symbol")
+            if sym:
+                symbols.append(sym)
+        return symbols
+
     def get_latest(self, symbol: str) -> dict[str, Any] | None:
         return self.prices.find_one({"symbol": symbol}, sort=[("date", -1)], projection={"_id": 0})
 
@@ -525,9 +830,11 @@ class StocksService:
                 out.append(sym)
         return out
 
-    def build_auto_context(self, user_text: str, default_exchange: str = "US") -> str:
+    def prefetch_context(self, user_text: str, default_exchange: str = "US") -> PrefetchedContext:
         text = user_text or ""
         lower = text.lower()
+        # Questions the stored EOD data cannot answer still need the tools.
+        needs_tools = any(hint in lower for hint in _TOOL_ONLY_HINTS)
 
         symbols = self.extract_symbols_from_text(text, default_exchange=default_exchange)
         if symbols:
@@ -539,7 +846,17 @@ class StocksService:
                 if count > max_symbols:
                     break
                 lines.append(self.build_context(sym))
-            return "\n".join(lines).strip() + "\n"
+            return PrefetchedContext(
+                text="\n".join(lines).strip() + "\n",
+                kind="stock",
+                symbols=symbols[:max_symbols],
+                complete=(
+                    len(symbols) <= max_symbols
+                    and not needs_tools
+                    and bool(_LATEST_BAR_HINTS.search(lower))
+                    and not _BEYOND_BAR_HINTS.search(lower)
+                ),
+            )
 
         wants_top = False
         if "top" in lower:
@@ -566,6 +883,15 @@ class StocksService:
                         top_n = int(digits)
                     except Exception:
                         top_n = 20
-            return self.build_universe_top_context(limit=top_n)
+            context = self.build_universe_top_context(limit=top_n)
+            has_rows = context.count("\n") > 1
+            return PrefetchedContext(
+                text=context,
+                kind="universe",
+                complete=has_rows and not needs_tools,
+            )
+
+        return PrefetchedContext(text="")
 
-        return ""
+    def build_auto_context(self, user_text: str, default_exchange: str = "US") -> str:
+        return self.prefetch_context(user_text, default_exchange=default_exchange).text
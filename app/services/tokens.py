@@ -0,0 +1,43 @@
+import logging
+from functools import lru_cache
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Chat-format overhead per message (role + separators), per OpenAI's guidance.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=8)
+def _encoder(model: str) -> Callable[[str], Any] | None:
+    try:
+        import tiktoken  # installed with langchain-openai
+    except ImportError:
+        return None
+    try:
+        try:
+            enc = tiktoken.encoding_for_model(model)
+        except KeyError:
+            enc = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Fetching the BPE file can fail offline; fall back to the estimate.
+        logger.warning("tiktoken encoding unavailable for %s; estimating tokens", model)
+        return None
+    return enc.encode
+
+
+def load_encoder(model: str = "gpt-4o-mini") -> bool:
+    """
+    Load the encoding for `model` ahead of the first count. The first load
+    reads (and may download) the BPE file, so call this off the event loop
+    at startup rather than from inside a request.
+    """
+    return _encoder(model) is not None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    encode = _encoder(model)
+    if encode is None:
+        # Roughly 4 characters per token for English text.
+        return (len(text or "") + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+    return len(encode(text or "")) + MESSAGE_OVERHEAD_TOKENS
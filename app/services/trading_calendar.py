@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import datetime as dt
+from functools import lru_cache
+
+# Unscheduled full-day NYSE closures that no holiday rule produces.
+_NYSE_SPECIAL_CLOSURES = {
+    dt.date(2001, 9, 11),
+    dt.date(2001, 9, 12),
+    dt.date(2001, 9, 13),
+    dt.date(2001, 9, 14),
+    dt.date(2004, 6, 11),
+    dt.date(2007, 1, 2),
+    dt.date(2012, 10, 29),
+    dt.date(2012, 10, 30),
+    dt.date(2018, 12, 5),
+    dt.date(2025, 1, 9),
+}
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> dt.date:
+    first = dt.date(year, month, 1)
+    offset = (weekday - first.weekday()) % 7
+    return first + dt.timedelta(days=offset + 7 * (n - 1))
+
+
+def _last_weekday(year: int, month: int, weekday: int) -> dt.date:
+    nxt = dt.date(year + (month == 12), month % 12 + 1, 1)
+    last = nxt - dt.timedelta(days=1)
+    return last - dt.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> dt.date:
+    # Anonymous Gregorian algorithm.
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return dt.date(year, month, day + 1)
+
+
+def _observed(day: dt.date) -> dt.date:
+    if day.weekday() == 5:
+        return day - dt.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + dt.timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=128)
+def nyse_holidays(year: int) -> frozenset[dt.date]:
+    days: set[dt.date] = set()
+    new_year = dt.date(year, 1, 1)
+    # NYSE does not close on Friday Dec 31 when Jan 1 falls on a Saturday.
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 1998:
+        days.add(_nth_weekday(year, 1, 0, 3))
+    days.add(_nth_weekday(year, 2, 0, 3))
+    days.add(_easter(year) - dt.timedelta(days=2))
+    days.add(_last_weekday(year, 5, 0))
+    if year >= 2022:
+        days.add(_observed(dt.date(year, 6, 19)))
+    days.add(_observed(dt.date(year, 7, 4)))
+    days.add(_nth_weekday(year, 9, 0, 1))
+    days.add(_nth_weekday(year, 11, 3, 4))
+    days.add(_observed(dt.date(year, 12, 25)))
+    days.update(d for d in _NYSE_SPECIAL_CLOSURES if d.year == year)
+    return frozenset(days)
+
+
+class TradingCalendar:
+    """
+    Trading-day model per exchange code.
+
+    US uses NYSE holiday rules; other exchanges fall back to Monday-Friday,
+    which over-reports gaps on their local holidays.
+    """
+
+    def __init__(self, exchange: str = "US"):
+        self.exchange = (exchange or "US").upper()
+
+    def is_trading_day(self, day: dt.date) -> bool:
+        if day.weekday() >= 5:
+            return False
+        if self.exchange == "US":
+            return day not in nyse_holidays(day.year)
+        return True
+
+    def trading_days(self, start: dt.date, end: dt.date) -> list[dt.date]:
+        out: list[dt.date] = []
+        day = start
+        while day <= end:
+            if self.is_trading_day(day):
+                out.append(day)
+            day += dt.timedelta(days=1)
+        return out
+
+    def previous_trading_day(self, day: dt.date) -> dt.date:
+        day -= dt.timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= dt.timedelta(days=1)
+        return day
@@ -0,0 +1,164 @@
+"""
+Per-request overhead of the request-id / process-time middleware.
+
+Drives the ASGI app in-process (no sockets, no server) so the numbers are
+the middleware stack itself, and compares four stacks on `/health` and
+`/api/stocks/{symbol}/latest` (served from an in-memory stocks service):
+
+    none      no middleware
+    starlette the previous BaseHTTPMiddleware versions
+    asgi      the current plain-ASGI versions (app.middleware)
+    main      asgi plus MetricsMiddleware, the stack app.main builds
+
+Run from the repo root:
+
+    python -m benchmarks.bench_middleware --requests 5000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from typing import Any
+
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.controllers.stocks_controller import router as stocks_router
+from app.core.app_logging import reset_request_id, set_request_id
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.process_time import ProcessTimeMiddleware
+from app.middleware.request_id import RequestIDMiddleware
+
+PATHS = ("/health", "/api/stocks/AAPL.US/latest")
+
+
+class LegacyRequestIDMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        token = set_request_id(request_id)
+        try:
+            response = await call_next(request)
+        finally:
+            reset_request_id(token)
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+
+class LegacyProcessTimeMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        response.headers["X-Process-Time"] = f"{time.perf_counter() - start:.6f}"
+        return response
+
+
+class _MemoryStocks:
+    def get_latest(self, symbol: str) -> dict[str, Any]:
+        return {
+            "symbol": symbol.upper(),
+            "date": "2024-01-02",
+            "open": 187.15,
+            "high": 188.44,
+            "low": 183.89,
+            "close": 185.64,
+            "adjusted_close": 184.73,
+            "volume": 82488700,
+            "source": "eodhd",
+        }
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+    app.state.stocks_service = _MemoryStocks()
+
+    @app.get("/health")
+    def healthcheck():
+        return {"status": "ok"}
+
+    app.include_router(stocks_router, prefix="/api")
+    # Same order as app.main: each add_middleware wraps the previous ones, so
+    # MetricsMiddleware (added last there) is outermost, then ProcessTime.
+    if stack == "starlette":
+        app.add_middleware(LegacyRequestIDMiddleware)
+        app.add_middleware(LegacyProcessTimeMiddleware)
+    elif stack in ("asgi", "main"):
+        app.add_middleware(RequestIDMiddleware)
+        app.add_middleware(ProcessTimeMiddleware)
+        if stack == "main":
+            app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def _call(app: FastAPI, path: str) -> dict[str, str]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+    headers: dict[str, str] = {}
+    status = 0
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers.update((k.decode().lower(), v.decode()) for k, v in message["headers"])
+
+    await app(scope, receive, send)
+    if status != 200:
+        raise RuntimeError(f"{path} returned {status}")
+    return headers
+
+
+async def _run(app: FastAPI, path: str, requests: int, warmup: int) -> list[float]:
+    for _ in range(warmup):
+        await _call(app, path)
+    samples: list[float] = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await _call(app, path)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+async def main(requests: int, warmup: int) -> None:
+    apps = {stack: build_app(stack) for stack in ("none", "starlette", "asgi", "main")}
+    for stack in ("starlette", "asgi", "main"):
+        headers = await _call(apps[stack], PATHS[0])
+        assert "x-request-id" in headers and "x-process-time" in headers, stack
+
+    print(f"{requests} requests per case, {warmup} warm-up; microseconds per request")
+    print(f"{'path':<28} {'stack':<10} {'mean':>8} {'p50':>8} {'p99':>8} {'overhead':>9}")
+    for path in PATHS:
+        base = None
+        for stack, app in apps.items():
+            samples = sorted(await _run(app, path, requests, warmup))
+            mean = statistics.fmean(samples)
+            p50 = samples[len(samples) // 2]
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            base = mean if base is None else base
+            overhead = "-" if stack == "none" else f"{mean - base:+.1f}"
+            print(f"{path:<28} {stack:<10} {mean:8.1f} {p50:8.1f} {p99:8.1f} {overhead:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.warmup))
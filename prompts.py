@@ -15,6 +15,15 @@ Stock data rules:
 - Stock data is End-Of-Day (EOD), not realtime; always mention the 'as of' date when answering price questions.
 """
 
+SYSTEM_SUMMARY = """
+You maintain a running summary of a conversation between a user and an assistant.
+Merge the earlier summary (if any) with the new messages into one updated summary.
+- Keep facts, symbols, dates, numbers, decisions and open questions the user still cares about.
+- Drop greetings, filler and anything superseded by later messages.
+- Write in the user's language, as short bullet points, under 200 words.
+Return only the summary.
+"""
+
 
 def build_messages(
     user_message: str,
@@ -0,0 +1,73 @@
+import datetime as dt
+
+from app.services.gaps import GapScanner
+
+
+class FakePrices:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def distinct(self, field):
+        return sorted({row[field] for row in self.rows})
+
+    def aggregate(self, pipeline, **kwargs):
+        match = pipeline[0]["$match"]
+        dates = match.get("date", {})
+        groups = {}
+        for row in self.rows:
+            if row["symbol"] not in match["symbol"]["$in"]:
+                continue
+            if "$gte" in dates and row["date"] < dates["$gte"]:
+                continue
+            if "$lte" in dates and row["date"] > dates["$lte"]:
+                continue
+            groups.setdefault(row["symbol"], []).append(row["date"])
+        return [
+            {"_id": symbol, "last": max(days), "dates": days}
+            for symbol, days in groups.items()
+        ]
+
+
+class FakeStocks:
+    sync_workers = 1
+
+    def __init__(self, rows):
+        self.prices = FakePrices(rows)
+
+    def first_dates(self, symbols):
+        out = {}
+        for row in self.prices.rows:
+            if row["symbol"] in symbols:
+                out[row["symbol"]] = min(out.get(row["symbol"], row["date"]), row["date"])
+        return out
+
+
+def _rows(symbol, days):
+    return [{"symbol": symbol, "date": day.isoformat()} for day in days]
+
+
+def test_missing_days_at_the_start_of_the_window_are_reported():
+    # Stored: Dec 2023 and from Jan 8 2024; Jan 2-5 2024 is missing.
+    stored = [dt.date(2023, 12, 28), dt.date(2023, 12, 29)]
+    stored += [dt.date(2024, 1, day) for day in (8, 9, 10, 11, 12)]
+    scanner = GapScanner(FakeStocks(_rows("AAPL.US", stored)))
+
+    report = scanner.scan(["AAPL.US"], from_date="2024-01-02", to_date="2024-01-12")
+
+    item = report.symbols[0]
+    assert item.first_date == "2023-12-28"
+    assert item.expected == 9
+    assert item.missing == 4
+    assert item.ranges == [("2024-01-02", "2024-01-05")]
+
+
+def test_days_before_the_first_stored_bar_are_not_gaps():
+    stored = [dt.date(2024, 1, day) for day in (8, 9, 10, 11, 12)]
+    scanner = GapScanner(FakeStocks(_rows("NEW.US", stored)))
+
+    report = scanner.scan(["NEW.US"], from_date="2024-01-02", to_date="2024-01-12")
+
+    item = report.symbols[0]
+    assert item.expected == 5
+    assert item.missing == 0
+    assert item.ranges == []
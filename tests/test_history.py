@@ -0,0 +1,77 @@
+import asyncio
+
+from app.services.history import HistoryBuilder
+
+
+class FakeCache:
+    def __init__(self, summary=None, max_messages=20):
+        self.summary = summary
+        self.max_messages = max_messages
+        self.token_counter = lambda text: len(text.split())
+
+    async def aget_summary(self, session_id):
+        return self.summary
+
+    async def aset_summary(self, session_id, text, through_id, tokens):
+        self.summary = {"text": text, "through_id": through_id, "tokens": tokens}
+
+
+class FakeAgent:
+    def __init__(self, reply="short summary"):
+        self.reply = reply
+        self.calls = []
+
+    async def asummarize(self, previous, messages, max_tokens=None):
+        self.calls.append((previous, list(messages), max_tokens))
+        return self.reply
+
+
+def _msg(i, tokens):
+    return {"role": "user" if i % 2 else "assistant", "content": f"m{i}", "id": i, "tokens": tokens}
+
+
+def test_oversized_summary_is_recompressed_when_nothing_folds():
+    cache = FakeCache({"text": "old " * 900, "through_id": 0, "tokens": 900})
+    agent = FakeAgent()
+    history = [_msg(1, 200)]
+
+    window = asyncio.run(HistoryBuilder(cache, agent, token_budget=1000).abuild("s", history))
+
+    assert agent.calls[0][1] == []
+    assert window.folded == 0
+    assert window.messages[1:] == history
+    assert window.tokens <= 1000
+    assert cache.summary["through_id"] == 0
+
+
+def test_summary_is_cut_when_the_model_overshoots():
+    cache = FakeCache({"text": "old " * 900, "through_id": 0, "tokens": 900})
+    agent = FakeAgent(reply="still long " * 600)
+
+    window = asyncio.run(HistoryBuilder(cache, agent, token_budget=1000).abuild("s", [_msg(1, 200)]))
+
+    assert window.tokens <= 1000
+    assert cache.summary["tokens"] <= 800
+
+
+def test_messages_about_to_be_trimmed_are_folded_within_budget():
+    cache = FakeCache(max_messages=6)
+    agent = FakeAgent()
+    history = [_msg(i, 10) for i in range(1, 7)]
+
+    window = asyncio.run(HistoryBuilder(cache, agent, token_budget=1000).abuild("s", history))
+
+    assert [m["id"] for m in agent.calls[0][1]] == [1, 2]
+    assert cache.summary["through_id"] == 2
+    assert [m.get("id") for m in window.messages[1:]] == [3, 4, 5, 6]
+
+
+def test_within_budget_and_capacity_makes_no_llm_call():
+    cache = FakeCache()
+    agent = FakeAgent()
+    history = [_msg(i, 10) for i in range(1, 5)]
+
+    window = asyncio.run(HistoryBuilder(cache, agent, token_budget=1000).abuild("s", history))
+
+    assert agent.calls == []
+    assert window.messages == history
@@ -0,0 +1,66 @@
+from app.services.stock_tools import ToolMemo, build_stock_tools, warm_tool_memo
+
+
+class FakeStocks:
+    def __init__(self):
+        self.calls = []
+
+    def latest_dates(self, symbols):
+        self.calls.append(("latest_dates", tuple(symbols)))
+        return {sym: "2024-01-02" for sym in symbols}
+
+    def latest_date(self, symbol):
+        self.calls.append(("latest_date", symbol))
+        return "2024-01-02"
+
+    def data_version(self):
+        self.calls.append(("data_version",))
+        return "2024-01-02:1"
+
+    def build_context(self, symbol):
+        self.calls.append(("build_context", symbol))
+        return f"[STOCK_DATA] {symbol}"
+
+    def build_universe_top_context(self, limit=20):
+        self.calls.append(("build_universe_top_context", limit))
+        return f"[UNIVERSE_TOP] {limit}"
+
+
+def _tools(stocks, memo):
+    return {tool.name: tool for tool in build_stock_tools(stocks, memo=memo)}
+
+
+def test_warmed_entries_are_served_by_the_tools():
+    stocks = FakeStocks()
+    memo = ToolMemo(ttl_seconds=60)
+
+    assert warm_tool_memo(memo, stocks, ["AAPL.US", "MSFT.US"], ttl_seconds=3600) == 3
+    stocks.calls.clear()
+    tools = _tools(stocks, memo)
+
+    assert tools["get_stock_context"].invoke({"symbol": "aapl"}) == "[STOCK_DATA] AAPL.US"
+    assert tools["get_universe_top"].invoke({}) == "[UNIVERSE_TOP] 20"
+    assert not [call for call in stocks.calls if call[0].startswith("build_")]
+    assert memo.stats()["shared_hits"] == 2
+    assert memo.stats()["misses"] == 0
+
+
+def test_warm_up_is_skipped_when_the_shared_layer_is_off():
+    stocks = FakeStocks()
+    memo = ToolMemo(ttl_seconds=0)
+
+    assert warm_tool_memo(memo, stocks, ["AAPL.US"]) == 0
+    assert stocks.calls == []
+
+
+def test_shared_hit_reads_the_version_without_an_aggregation():
+    stocks = FakeStocks()
+    memo = ToolMemo(ttl_seconds=60)
+    tools = _tools(stocks, memo)
+
+    tools["get_stock_context"].invoke({"symbol": "AAPL.US"})
+    stocks.calls.clear()
+    assert tools["get_stock_context"].invoke({"symbol": "AAPL.US"}) == "[STOCK_DATA] AAPL.US"
+
+    assert memo.stats()["shared_hits"] == 1
+    assert stocks.calls == [("latest_date", "AAPL.US")]